@@ -0,0 +1,364 @@
+# The rule-based diagnostic engine, independent of the web app so batch jobs
+# (see diagnose.py) can use it without importing Flask or SQLAlchemy.
+
+import heapq
+from operator import itemgetter
+
+from cache import LRUCache
+from catalog import Catalog, DiseaseResult
+from diseases import disease_database, symptoms
+
+# Rule 2 orderings: raw symptom match count, or naive-Bayes log likelihood
+RANKINGS = ('matches', 'bayes')
+
+# Herd screening needs NumPy; the rest of the advisor works without it
+try:
+    from herd import HerdScreener
+except ImportError:
+    HerdScreener = None
+
+
+# Rule-based disease diagnostic system
+class LivestockHealthAdvisor:
+    # engine='fused' evaluates all rules in one pass, engine='chain' runs them one after another.
+    # ranking picks the default Rule 2 ordering (see RANKINGS); searches can override it.
+    # fuzzy=True lets Rule 3 fall back to typo-tolerant matching when nothing matches exactly.
+    # cache_size bounds the LRU cache of search results (0 disables it).
+    def __init__(self, catalog=None, engine='fused', fuzzy=True, cache_size=1024, ranking='matches'):
+        # The catalog is immutable and shared by all requests; the rules only
+        # ever write to per-request DiseaseResult views. Its per-species mappings
+        # load a species from the catalog backend the first time it is searched.
+        # swap_catalog replaces it as a whole; each search reads self.catalog once
+        # and passes that snapshot down, so it runs against a single version.
+        self.catalog = catalog if catalog is not None else Catalog.from_source(disease_database, symptoms)
+        self.engine = engine
+        self.ranking = ranking
+        self.fuzzy = fuzzy
+        self.result_cache = LRUCache(cache_size) if cache_size else None
+        self.herd_screener = None
+
+    @property
+    def disease_database(self):
+        return self.catalog.diseases
+
+    @property
+    def symptoms(self):
+        return self.catalog.symptoms
+
+    @property
+    def symptom_index(self):
+        return self.catalog.symptom_index
+
+    # Serve a new catalog from now on. Searches already running finish on the old one;
+    # cached results are dropped, since their keys name a version that will not come back.
+    def swap_catalog(self, catalog):
+        previous = self.catalog
+        self.catalog = catalog
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        return previous
+
+    # Encode a list of symptoms as a bitset over the species' symptoms (unknown symptoms match nothing)
+    def symptom_mask(self, animal_type, symptom_list, catalog=None):
+        return (catalog or self.catalog).symptom_mask(animal_type, symptom_list)
+
+    # Rules 1-3 and the engines take an optional catalog snapshot (default: the current catalog)
+
+    # Rule 1: Filter diseases based on selected symptoms
+    def filter_by_symptoms(self, animal_type, selected_symptoms, catalog=None):
+        species = (catalog or self.catalog).species(animal_type)
+        if not selected_symptoms:
+            return species.diseases
+
+        # Union the postings of the selected symptoms, then walk the set bits in catalog order
+        postings = species.symptom_index
+        candidates = 0
+        for symptom in selected_symptoms:
+            candidates |= postings.get(symptom, 0)
+
+        diseases = species.diseases
+        filtered_diseases = []
+        while candidates:
+            lowest_bit = candidates & -candidates
+            filtered_diseases.append(diseases[lowest_bit.bit_length() - 1])
+            candidates ^= lowest_bit
+
+        return filtered_diseases
+    
+    # Rule 2: Sort diseases by symptom match count (highest first)
+    def sort_by_match_count(self, animal_type, diseases, selected_symptoms, catalog=None):
+        if not selected_symptoms:
+            return diseases
+            
+        # Count matching symptoms for each disease as a popcount and sort
+        query_mask = self.symptom_mask(animal_type, selected_symptoms, catalog)
+        return sorted(
+            diseases,
+            key=lambda disease: (disease.symptom_mask & query_mask).bit_count(),
+            reverse=True
+        )
+    
+    # Rule 2, ranking='bayes': sort by the log likelihood of the selected symptoms under each
+    # disease, so one specific symptom can outweigh several that many diseases share.
+    # Each matched symptom adds its precomputed weight (see SpeciesCatalog); selected
+    # symptoms a disease lacks are taken as explained by background and add nothing.
+    def sort_by_likelihood(self, animal_type, diseases, selected_symptoms, catalog=None):
+        if not selected_symptoms:
+            return diseases
+
+        weights = (catalog or self.catalog).species(animal_type).symptom_log_likelihoods
+        selected_symptoms = list(dict.fromkeys(selected_symptoms))
+        return sorted(
+            diseases,
+            key=lambda disease: sum(weights[s] for s in selected_symptoms if s in disease.symptom_set),
+            reverse=True
+        )
+    
+    # Rule 3: Filter by search text in name, description, or symptoms
+    def filter_by_search_text(self, animal_type, diseases, search_text, catalog=None):
+        if not search_text:
+            return diseases
+            
+        # Resolve the text through the species' full-text index, then keep list order
+        matches = (catalog or self.catalog).search_text(animal_type, search_text.lower(), fuzzy=self.fuzzy)
+        return [disease for disease in diseases if disease in matches]
+    
+    # Rules 4-6 annotate per-request DiseaseResult views, never the catalog records
+
+    # Rule 4: Identify critical conditions that require immediate veterinary attention
+    def flag_critical_conditions(self, results):
+        for result in results:
+            result.urgent = result.disease.urgent
+        return results
+    
+    # Rule 5: Calculate symptom coverage percentage
+    def calculate_symptom_coverage(self, results, selected_symptoms):
+        if not selected_symptoms:
+            for result in results:
+                result.symptom_coverage = 0
+            return results
+            
+        for result in results:
+            matching_symptoms = [s for s in selected_symptoms if s in result.symptom_set]
+            result.matching_symptoms = matching_symptoms
+            result.symptom_coverage = len(matching_symptoms) / len(selected_symptoms) * 100
+            
+        return results
+    
+    # Rule 6: Apply severity rating score
+    def apply_severity_rating(self, results):
+        for result in results:
+            result.severity_score = result.disease.severity_score
+            
+        return results
+    
+    # Main search method: the ranked results, or with limit/offset one page of them
+    def search_diseases(self, animal_type, selected_symptoms, search_text, ranking=None,
+                        limit=None, offset=0, catalog=None):
+        return self.search_page(animal_type, selected_symptoms, search_text, ranking, limit, offset, catalog)[0]
+
+    # One page of results and the total number of results: (results[offset:offset + limit], total).
+    # Only the first offset + limit results are selected and built, so the work follows
+    # the page size rather than the number of matching diseases. Repeated queries are
+    # answered from the result cache; otherwise all rules run with the configured engine.
+    def search_page(self, animal_type, selected_symptoms, search_text, ranking=None,
+                    limit=None, offset=0, catalog=None):
+        ranking = ranking or self.ranking
+        if ranking not in RANKINGS:
+            raise ValueError(f'Unknown ranking {ranking!r}, expected one of {RANKINGS}')
+        catalog = catalog or self.catalog
+        top = None if limit is None else offset + limit
+        # A repeated symptom counts once, with or without the cache; the rules see the
+        # distinct symptoms in the order they were selected
+        selected_symptoms = list(dict.fromkeys(selected_symptoms))
+        if self.result_cache is None:
+            results, total = self.apply_rules(animal_type, selected_symptoms, search_text, ranking, catalog, top)
+            return results[offset:], total
+
+        # Results list matching symptoms in selection order, so the order is part of the key;
+        # the catalog version keeps entries from a replaced catalog out
+        key = (catalog.version, animal_type, tuple(selected_symptoms), (search_text or '').lower(), ranking, top)
+        entry = self.result_cache.get(key)
+        if entry is None:
+            results, total = self.apply_rules(animal_type, selected_symptoms, search_text, ranking, catalog, top)
+            entry = (tuple(results), total)
+            self.result_cache.put(key, entry)
+
+        # Cached DiseaseResult views are shared between requests and must not be modified
+        results, total = entry
+        return list(results[offset:]), total
+
+    # Evaluate a batch of queries in one call, returning a (results, total) page for each.
+    # A query is a tuple of search_page arguments: (animal_type, selected_symptoms,
+    # search_text[, ranking, limit, offset]). Queries that differ only in repeated
+    # symptoms or text case are computed once.
+    def search_many(self, queries):
+        # The whole batch is answered from one catalog version
+        catalog = self.catalog
+        answered = {}
+        batch_results = []
+        for animal_type, selected_symptoms, search_text, *options in queries:
+            key = (animal_type, tuple(dict.fromkeys(selected_symptoms)), (search_text or '').lower(), *options)
+            if key not in answered:
+                answered[key] = self.search_page(
+                    animal_type, selected_symptoms, search_text, *options, catalog=catalog
+                )
+            batch_results.append(answered[key])
+        return batch_results
+
+    # One animal record from records.py as a JSON-ready dict: the top `limit` results
+    # and whether any of them is urgent, or the parse error / unknown species
+    def diagnose_record(self, line_number, record, error, limit=3):
+        catalog = self.catalog
+        error = self.record_error(record, error, catalog)
+        if error:
+            return {'line': line_number, 'error': error}
+
+        # Only the top `limit` results are built; urgency covers every candidate, from bitsets
+        results = self.search_diseases(record['animal_type'], record['symptoms'], '', limit=limit, catalog=catalog)
+        species = catalog.species(record['animal_type'])
+        urgent = bool(species.candidate_mask(record['symptoms']) & species.urgent_mask)
+        return self.diagnosis(line_number, record, urgent, results)
+
+    # diagnose_record for a list of (line_number, record, error), answered in input order.
+    # With NumPy the records of each species are screened together as one herd; without
+    # it, or under the Bayesian ranking the herd engine lacks, one at a time.
+    def diagnose_records(self, entries, limit=3):
+        if HerdScreener is None or self.ranking != 'matches':
+            return [self.diagnose_record(line_number, record, error, limit) for line_number, record, error in entries]
+
+        catalog = self.catalog
+        answers = [None] * len(entries)
+        # animal type -> positions in entries of that species' records
+        herds = {}
+        for position, (line_number, record, error) in enumerate(entries):
+            error = self.record_error(record, error, catalog)
+            if error:
+                answers[position] = {'line': line_number, 'error': error}
+            else:
+                herds.setdefault(record['animal_type'], []).append(position)
+
+        for animal_type, positions in herds.items():
+            screening = self.screen_herd(animal_type, [entries[position][1]['symptoms'] for position in positions], catalog)
+            for animal, position in enumerate(positions):
+                line_number, record, error = entries[position]
+                answers[position] = self.diagnosis(
+                    line_number, record, screening.any_urgent(animal), screening.results(animal, limit)
+                )
+        return answers
+
+    # The parse error of a record, or an error for a species the catalog lacks
+    def record_error(self, record, error, catalog):
+        if error is None and record['animal_type'] not in catalog.diseases:
+            return f"unknown animal_type {record['animal_type']!r}"
+        return error
+
+    def diagnosis(self, line_number, record, urgent, results):
+        return {
+            'line': line_number,
+            'animal_id': record['animal_id'],
+            'animal_type': record['animal_type'],
+            'urgent': urgent,
+            'results': [result.to_dict() for result in results]
+        }
+
+    # Herd mode: rank diseases for every animal of one species with a single
+    # matrix multiply. herd_symptoms holds one symptom list per animal.
+    def screen_herd(self, animal_type, herd_symptoms, catalog=None):
+        if HerdScreener is None:
+            raise RuntimeError('Herd screening requires NumPy (pip install numpy)')
+        catalog = catalog or self.catalog
+        herd_screener = self.herd_screener
+        if herd_screener is None or herd_screener.catalog is not catalog:
+            herd_screener = self.herd_screener = HerdScreener(catalog)
+        return herd_screener.screen(animal_type, herd_symptoms)
+
+    # Ranked results of all rules with the configured engine: (top `limit` results, total)
+    def apply_rules(self, animal_type, selected_symptoms, search_text, ranking=None, catalog=None, limit=None):
+        if self.engine == 'fused':
+            return self.search_diseases_fused(animal_type, selected_symptoms, search_text, ranking, catalog, limit)
+        return self.search_diseases_chain(animal_type, selected_symptoms, search_text, ranking, catalog, limit)
+
+    # Rule chain: apply each rule in sequence. Rules 4-6 only run on the top `limit` diseases.
+    def search_diseases_chain(self, animal_type, selected_symptoms, search_text, ranking=None, catalog=None,
+                              limit=None):
+        catalog = catalog or self.catalog
+        results = self.filter_by_symptoms(animal_type, selected_symptoms, catalog)
+        if (ranking or self.ranking) == 'bayes':
+            results = self.sort_by_likelihood(animal_type, results, selected_symptoms, catalog)
+        else:
+            results = self.sort_by_match_count(animal_type, results, selected_symptoms, catalog)
+        results = self.filter_by_search_text(animal_type, results, search_text, catalog)
+        total = len(results)
+        results = [DiseaseResult(disease) for disease in results[:limit]]
+        results = self.flag_critical_conditions(results)
+        results = self.calculate_symptom_coverage(results, selected_symptoms)
+        results = self.apply_severity_rating(results)
+        
+        return results, total
+
+    # Fused engine: same output as the rule chain. Rules 1 and 3 intersect bitsets of
+    # candidate positions, Rule 2 scores each candidate from one bitset intersection,
+    # a heap selects the top `limit`, and Rules 4-6 build result views only for those
+    def search_diseases_fused(self, animal_type, selected_symptoms, search_text, ranking=None, catalog=None,
+                              limit=None):
+        catalog = catalog or self.catalog
+        species = catalog.species(animal_type)
+        if (ranking or self.ranking) == 'bayes' and selected_symptoms:
+            # (bit, weight) of each distinct selected symptom, in selection order; candidates
+            # share a handful of match masks, so each mask's score is summed only once
+            weights = species.symptom_log_likelihoods
+            query_weights = [
+                (species.symptom_bits[s], weights[s]) for s in dict.fromkeys(selected_symptoms) if s in weights
+            ]
+            mask_scores = {}
+        else:
+            mask_scores = None
+        query_mask = species.symptom_mask(selected_symptoms)
+        diseases = species.diseases
+
+        # Rule 1: diseases with any selected symptom (all of them when none are selected)
+        candidates = species.candidate_mask(selected_symptoms)
+        # Rule 3: search text in name, description, or symptoms
+        if search_text:
+            candidates &= species.search_text_mask(search_text.lower(), fuzzy=self.fuzzy)
+        total = candidates.bit_count()
+
+        # Walk the candidates in catalog order. Without selected symptoms nothing is ranked,
+        # so the walk stops once the page is full.
+        ranked = []
+        while candidates and (selected_symptoms or limit is None or len(ranked) < limit):
+            lowest_bit = candidates & -candidates
+            disease = diseases[lowest_bit.bit_length() - 1]
+            candidates ^= lowest_bit
+
+            # Rule 2: match count (or likelihood score) from one bitset intersection
+            match_mask = disease.symptom_mask & query_mask
+            if mask_scores is None:
+                score = match_mask.bit_count()
+            else:
+                score = mask_scores.get(match_mask)
+                if score is None:
+                    score = mask_scores[match_mask] = sum(weight for bit, weight in query_weights if bit & match_mask)
+            ranked.append((score, disease, match_mask))
+
+        if selected_symptoms:
+            # nlargest keeps catalog order among equal scores, like the stable sort
+            if limit is not None and limit < total:
+                ranked = heapq.nlargest(limit, ranked, key=itemgetter(0))
+            else:
+                ranked.sort(key=itemgetter(0), reverse=True)
+
+        results = []
+        for score, disease, match_mask in ranked:
+            # Rules 4 and 6: urgency and severity score are precompiled into the catalog
+            result = DiseaseResult(disease, urgent=disease.urgent, severity_score=disease.severity_score)
+
+            # Rule 5: symptom coverage from the same intersection
+            if selected_symptoms:
+                matching_symptoms = [s for s in selected_symptoms if species.symptom_bits.get(s, 0) & match_mask]
+                result.matching_symptoms = matching_symptoms
+                result.symptom_coverage = len(matching_symptoms) / len(selected_symptoms) * 100
+            results.append(result)
+
+        return results, total
@@ -0,0 +1,217 @@
+# In-process query analytics: which symptoms and symptom combinations are
+# searched most, per species, and which queries find nothing.
+#
+# A search costs one deque append (atomic, no lock). A flusher thread drains the
+# events every `interval` seconds, counts them exactly for that window, hands
+# the window's complete counts to the sinks (one record per window, never one
+# per request), so summing the records of every process gives exact totals. The
+# running totals kept in memory hold the heaviest hitters only, in Space-Saving
+# sketches, so memory stays bounded however long the process runs.
+#
+# A process forked after start() (gunicorn --preload) gets its own flusher and
+# starts counting from zero; events recorded before the fork are the parent's.
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Events waiting for the flusher; the oldest are dropped beyond this
+MAX_PENDING_EVENTS = 100000
+
+
+# Space-Saving heavy hitters: approximate counts of the most frequent keys of a stream
+# in `capacity` counters. Every key seen more than total/capacity times is kept, and a
+# count overestimates by at most its error.
+class SpaceSaving:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            # The new key takes over the smallest counter and inherits its count as error
+            smallest = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(smallest)
+            del self.errors[smallest]
+            self.counts[key] = floor + count
+            self.errors[key] = floor
+
+    # [(key, count, error)], highest count first
+    def top(self, n):
+        keys = sorted(self.counts, key=self.counts.get, reverse=True)[:n]
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+
+# Running totals for one species
+class SpeciesTotals:
+    def __init__(self, top_size):
+        self.queries = 0
+        self.zero_results = 0
+        self.symptoms = SpaceSaving(top_size * 10)
+        self.combinations = SpaceSaving(top_size)
+        self.zero_result_queries = SpaceSaving(top_size)
+
+
+class QueryAnalytics:
+    # top_size: combinations kept per species (ten times as many single symptoms).
+    # sinks: callables run as sink(window) with each flushed window's complete counts.
+    def __init__(self, top_size=100, interval=60.0, sinks=()):
+        self.top_size = top_size
+        self.interval = interval
+        self.sinks = list(sinks)
+        self.events = collections.deque(maxlen=MAX_PENDING_EVENTS)
+        # Held by the flusher and by readers, never by searches
+        self.lock = threading.Lock()
+        self.species = {}
+        self.started_at = time.time()
+        self.flushes = 0
+        self.thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.after_fork)
+
+    # Called once per search: symptoms in any order, total = number of results
+    def record(self, animal_type, symptoms, search_text, total):
+        self.events.append((animal_type, tuple(sorted(set(symptoms))), search_text.strip().lower(), total == 0))
+
+    # Exact counts of the events so far, by species
+    def drain(self):
+        window = {}
+        events = self.events
+        while events:
+            try:
+                animal_type, combination, search_text, zero = events.popleft()
+            except IndexError:
+                break
+            counts = window.get(animal_type)
+            if counts is None:
+                counts = window[animal_type] = {
+                    'queries': 0,
+                    'zero_results': 0,
+                    'symptoms': collections.Counter(),
+                    'combinations': collections.Counter(),
+                    'zero_result_queries': collections.Counter()
+                }
+            counts['queries'] += 1
+            counts['symptoms'].update(combination)
+            if combination:
+                counts['combinations'][combination] += 1
+            if zero:
+                counts['zero_results'] += 1
+                counts['zero_result_queries'][(combination, search_text)] += 1
+        return window
+
+    # Fold the pending events into the totals and pass the window to the sinks
+    def flush(self):
+        with self.lock:
+            window = self.drain()
+            if not window:
+                return
+            for animal_type, counts in window.items():
+                totals = self.species.get(animal_type)
+                if totals is None:
+                    totals = self.species[animal_type] = SpeciesTotals(self.top_size)
+                totals.queries += counts['queries']
+                totals.zero_results += counts['zero_results']
+                for symptom, count in counts['symptoms'].items():
+                    totals.symptoms.add(symptom, count)
+                for combination, count in counts['combinations'].items():
+                    totals.combinations.add(combination, count)
+                for query, count in counts['zero_result_queries'].items():
+                    totals.zero_result_queries.add(query, count)
+            self.flushes += 1
+
+        record = {
+            'time': time.time(),
+            'pid': os.getpid(),
+            'species': {
+                animal_type: {
+                    'queries': counts['queries'],
+                    'zero_results': counts['zero_results'],
+                    'symptoms': counts['symptoms'].most_common(),
+                    'combinations': [[list(key), count] for key, count in counts['combinations'].most_common()],
+                    'zero_result_queries': [
+                        {'symptoms': list(combination), 'search_text': search_text, 'count': count}
+                        for (combination, search_text), count in counts['zero_result_queries'].most_common()
+                    ]
+                }
+                for animal_type, counts in window.items()
+            }
+        }
+        for sink in self.sinks:
+            try:
+                sink(record)
+            except Exception:
+                logger.exception('Query analytics sink failed')
+
+    # Totals since start, the top `limit` entries of each list, for one species or all
+    def report(self, animal_type=None, limit=20):
+        self.flush()
+        with self.lock:
+            species = {
+                name: {
+                    'queries': totals.queries,
+                    'zero_results': totals.zero_results,
+                    'symptoms': [
+                        {'symptom': symptom, 'count': count, 'error': error}
+                        for symptom, count, error in totals.symptoms.top(limit)
+                    ],
+                    'combinations': [
+                        {'symptoms': list(combination), 'count': count, 'error': error}
+                        for combination, count, error in totals.combinations.top(limit)
+                    ],
+                    'zero_result_queries': [
+                        {'symptoms': list(combination), 'search_text': search_text, 'count': count, 'error': error}
+                        for (combination, search_text), count, error in totals.zero_result_queries.top(limit)
+                    ]
+                }
+                for name, totals in self.species.items()
+                if animal_type is None or name == animal_type
+            }
+            return {'since': self.started_at, 'flushes': self.flushes, 'species': species}
+
+    def watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Query analytics flush failed')
+
+    # Flush every interval seconds in a daemon thread
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.watch, name='query-analytics', daemon=True)
+            self.thread.start()
+        return self
+
+    def after_fork(self):
+        started = self.thread is not None
+        self.events = collections.deque(maxlen=MAX_PENDING_EVENTS)
+        # The flusher may have held the lock when the parent forked
+        self.lock = threading.Lock()
+        self.species = {}
+        self.started_at = time.time()
+        self.flushes = 0
+        self.thread = None
+        if started:
+            self.start()
+
+
+# Sink appending each window as one JSON line to path; every process appends its own
+# windows, and summing them gives the totals across workers
+def json_lines_sink(path):
+    def write(record):
+        with open(path, 'a', encoding='utf-8') as output:
+            output.write(json.dumps(record, separators=(',', ':')) + '\n')
+    return write
@@ -1,14 +1,95 @@
-from flask import Flask, render_template_string, request
+from flask import Flask, request, jsonify, make_response, abort, send_file, stream_template, stream_with_context
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime, timezone
+from markupsafe import Markup
+from sqlalchemy import event, or_, select
+from sqlalchemy.exc import IntegrityError
+import atexit
+import functools
+import hashlib
+import hmac
+import importlib
+import json
 import os
+from itertools import islice
+
+import diseases
+import images
+from assets import ASSET_MAX_AGE, AssetManifest
+from advisor import RANKINGS, LivestockHealthAdvisor
+from analytics import QueryAnalytics, json_lines_sink
+from cache import LRUCache
+from hashing import HashingBusy, PasswordHasher
+from keys import load_secret_keys
+from catalog import load_catalog, open_catalog
+from records import RECORD_FORMATS, decode_lines, read_records
+from reloader import CatalogReloader
+from writebehind import WriteBehindQueue
 
 app = Flask(__name__)
 
-app.config['SECRET_KEY'] = os.urandom(24)
+# Session signing keys, the same in every worker process and on every host: SECRET_KEY
+# (and space-separated SECRET_KEY_FALLBACKS still accepted) from the environment, or the
+# key file, created on first start (see keys.py for rotation)
+app.config['SECRET_KEY_FILE'] = os.environ.get('SECRET_KEY_FILE') or os.path.join(app.instance_path, 'secret_key')
+if os.environ.get('SECRET_KEY'):
+    app.config['SECRET_KEY'] = os.environ['SECRET_KEY']
+    app.config['SECRET_KEY_FALLBACKS'] = os.environ.get('SECRET_KEY_FALLBACKS', '').split()
+else:
+    app.config['SECRET_KEY'], app.config['SECRET_KEY_FALLBACKS'] = load_secret_keys(app.config['SECRET_KEY_FILE'])
+# The session cookie: not readable by scripts, not sent on cross-site subrequests, and
+# HTTPS-only when SESSION_COOKIE_SECURE=1 (set it when serving over TLS)
+app.config['SESSION_COOKIE_HTTPONLY'] = True
+app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE') == '1'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connections kept open to users.db, extra ones allowed under load, and seconds to wait for one
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.environ.get('USER_DB_POOL_SIZE', '8')),
+    'max_overflow': int(os.environ.get('USER_DB_MAX_OVERFLOW', '8')),
+    'pool_timeout': 10
+}
+app.config['PAGE_CACHE_SIZE'] = 512
+app.config['API_BATCH_LIMIT'] = 100
+# Results per page on /search, and the default and largest API page sizes
+app.config['RESULTS_PAGE_SIZE'] = 20
+app.config['API_PAGE_SIZE'] = 20
+app.config['API_MAX_PAGE_SIZE'] = 100
+# Animals of a herd upload diagnosed together (one matrix multiply per species)
+# before their lines are streamed back
+app.config['HERD_STREAM_BATCH'] = 64
+# Stream /search pages that are not cached yet, so the head, CSS and emergency banner
+# reach the browser before the result cards are rendered; writes are at least
+# STREAM_CHUNK_SIZE bytes
+app.config['STREAM_RESULTS'] = os.environ.get('STREAM_RESULTS', '1') == '1'
+app.config['STREAM_CHUNK_SIZE'] = 2048
+# Let the front-end server (nginx X-Accel / Apache mod_xsendfile) send static files
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# Serve a prebuilt JSON or SQLite catalog (see catalog.py) instead of diseases.py
+app.config['CATALOG_PATH'] = os.environ.get('CATALOG_PATH')
+# Seconds between checks of the catalog source for changes (0 turns watching off)
+app.config['CATALOG_RELOAD_INTERVAL'] = float(os.environ.get('CATALOG_RELOAD_INTERVAL', '5'))
+# Bearer token for the /admin routes; while it is unset they refuse every request
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+# Password hashing (see hashing.py): werkzeug method and cost for new hashes, threads
+# hashing at once, hashes queued behind them, and seconds a request waits for its hash
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', '16'))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+# Diagnosis history of logged-in users: rows per insert batch, seconds a row may wait for
+# its batch, rows queued before new ones are dropped, and results kept per search
+app.config['HISTORY_BATCH_SIZE'] = 200
+app.config['HISTORY_FLUSH_INTERVAL'] = float(os.environ.get('HISTORY_FLUSH_INTERVAL', '0.5'))
+app.config['HISTORY_QUEUE_SIZE'] = 10000
+app.config['HISTORY_TOP_RESULTS'] = 3
+# Query analytics (see analytics.py): seconds between aggregate flushes, combinations
+# tracked per species, and the file each flushed window is appended to
+app.config['ANALYTICS_FLUSH_INTERVAL'] = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', '60'))
+app.config['ANALYTICS_TOP_SIZE'] = 100
+app.config['ANALYTICS_PATH'] = os.environ.get('ANALYTICS_PATH') or os.path.join(app.instance_path, 'query-analytics.ndjson')
 db = SQLAlchemy(app)
 
 # User model for the database
@@ -21,16 +102,99 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# One /search by a logged-in user: the query and its leading results ({id, name,
+# symptom_coverage}); created_at is the time of the search, in UTC
+class DiagnosisHistory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), nullable=False, index=True)
+    animal_type = db.Column(db.String(80), nullable=False)
+    symptoms = db.Column(db.JSON, nullable=False)
+    search_text = db.Column(db.String(200), nullable=False, default='')
+    top_results = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Set on every new users.db connection. WAL lets reads go on while a write commits and
+# makes NORMAL sync safe; busy_timeout (ms) makes a second writer wait for the lock
+# instead of failing at once.
+USER_DB_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA temp_store=MEMORY'
+)
+
+def set_user_db_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in USER_DB_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
 # Create the database tables
 with app.app_context():
+    event.listen(db.engine, 'connect', set_user_db_pragmas)
     db.create_all()
 
+# Message for a username or email that is already registered, or None. One query over
+# the two unique indexes; the username is reported first when both are taken.
+def registration_conflict(session, username, email):
+    taken = session.scalars(
+        select(User).where(or_(User.username == username, User.email == email)).limit(2)
+    ).all()
+    if any(user.username == username for user in taken):
+        return 'Username already exists.'
+    if taken:
+        return 'Email already in use.'
+    return None
+
+# Add a user, returning None or the conflict message. The unique constraints have the last
+# word, so of two concurrent registrations of the same name only one succeeds.
+def create_user(session, username, email, password_hash):
+    session.add(User(username=username, email=email, password_hash=password_hash))
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return registration_conflict(session, username, email) or 'Username or email already in use.'
+    return None
+
+def find_user(session, username):
+    return session.scalars(select(User).where(User.username == username)).first()
+
+# A batch of history rows in one transaction
+def write_history(rows):
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(DiagnosisHistory.__table__.insert(), rows)
+
+# History rows are written behind the requests that produce them, and whatever is
+# still queued is written when the process exits
+diagnosis_history = WriteBehindQueue(
+    write_history,
+    app.config['HISTORY_BATCH_SIZE'],
+    app.config['HISTORY_FLUSH_INTERVAL'],
+    app.config['HISTORY_QUEUE_SIZE'],
+    name='diagnosis-history'
+).start()
+atexit.register(diagnosis_history.close)
+
 @app.route('/')
 def home():
     if 'username' in session:
         return render_template('index.html', username=session['username'])
     return redirect(url_for('login.html'))
 
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    app.config['PASSWORD_HASH_WORKERS'],
+    app.config['PASSWORD_HASH_QUEUE'],
+    app.config['PASSWORD_HASH_TIMEOUT']
+)
+
+# Sign-ins beyond what the hashing pool can take are turned away rather than queued without limit
+@app.errorhandler(HashingBusy)
+def hashing_busy(error):
+    return 'Too many sign-ins in progress, please try again shortly.', 503, {'Retry-After': '5'}
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -38,26 +202,15 @@ def register():
         email = request.form['email']
         password = request.form['password']
         
-        # Check if username or email already exists
-        existing_user = User.query.filter_by(username=username).first()
-        if existing_user:
-            flash('Username already exists.')
+        # Check if username or email already exists, before paying for the hash
+        conflict = registration_conflict(db.session, username, email)
+        if conflict is None:
+            # Create new user with hashed password
+            conflict = create_user(db.session, username, email, password_hasher.hash(password))
+        if conflict:
+            flash(conflict)
             return redirect(url_for('register'))
         
-        existing_email = User.query.filter_by(email=email).first()
-        if existing_email:
-            flash('Email already in use.')
-            return redirect(url_for('register'))
-        
-        # Create new user with hashed password
-        new_user = User(username=username, 
-                        email=email, 
-                        password_hash=generate_password_hash(password))
-        
-        # Add user to the database
-        db.session.add(new_user)
-        db.session.commit()
-        
         flash('Registration successful! Please log in.')
         return redirect(url_for('templates', filename='login'))
     
@@ -70,9 +223,9 @@ def login():
         password = request.form['password']
         
         # Check if user exists
-        user = User.query.filter_by(username=username).first()
+        user = find_user(db.session, username)
         
-        if user and check_password_hash(user.password_hash, password):
+        if user and password_hasher.check(user.password_hash, password):
             session['username'] = username
             flash('Logged in successfully!')
             return redirect(url_for('templates', filename='index.html'))
@@ -90,267 +243,20 @@ def logout():
 if __name__ == '__main__':
     app.run(debug=True, use_reloader=False)
 
-# Database of diseases and remedies
-disease_database = {
-    'cattle': [
-        {
-            'id': 1,
-            'name': "Bovine Respiratory Disease (BRD)",
-            'symptoms': ["coughing", "nasal discharge", "fever", "reduced appetite", "labored breathing"],
-            'description': "A complex of diseases affecting the lungs and respiratory tract of cattle.",
-            'severity': "High",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Antibiotics like florfenicol, tulathromycin, or tilmicosin as prescribed by a veterinarian."
-                },
-                {
-                    'type': "Management",
-                    'details': "Provide good ventilation, reduce stress, isolate affected animals."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Vaccination against viral pathogens, proper nutrition, and stress management."
-                }
-            ]
-        },
-        {
-            'id': 2,
-            'name': "Foot and Mouth Disease",
-            'symptoms': ["fever", "blisters on mouth", "blisters on feet", "excessive salivation", "lameness"],
-            'description': "A highly contagious viral disease affecting cloven-hoofed animals.",
-            'severity': "Critical - Reportable Disease",
-            'treatments': [
-                {
-                    'type': "Action Required",
-                    'details': "Contact veterinary authorities immediately. This is a notifiable disease."
-                },
-                {
-                    'type': "Management",
-                    'details': "Quarantine affected animals, implement biosecurity measures."
-                },
-                {
-                    'type': "Treatment",
-                    'details': "Supportive care only. Treatment focuses on pain management and preventing secondary infections."
-                }
-            ]
-        },
-        {
-            'id': 3,
-            'name': "Mastitis",
-            'symptoms': ["swollen udder", "abnormal milk", "pain in udder", "reduced milk production", "fever"],
-            'description': "Inflammation of the mammary gland usually caused by bacterial infection.",
-            'severity': "Moderate to High",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Intramammary antibiotics, systemic antibiotics for severe cases as prescribed by vet."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Frequent milking, cold or warm compresses, anti-inflammatory drugs."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Good milking hygiene, proper housing, teat dipping after milking."
-                }
-            ]
-        }
-    ],
-    'goat': [
-        {
-            'id': 1,
-            'name': "Caprine Arthritis Encephalitis (CAE)",
-            'symptoms': ["joint swelling", "lameness", "weight loss", "pneumonia", "neurological symptoms"],
-            'description': "A viral disease affecting goats that causes chronic progressive arthritis and encephalitis.",
-            'severity': "High - No Cure",
-            'treatments': [
-                {
-                    'type': "Management",
-                    'details': "No specific treatment. Manage pain with anti-inflammatory drugs prescribed by a vet."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Testing and culling, separating kids from infected dams at birth."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Provide comfortable bedding, easy access to food and water."
-                }
-            ]
-        },
-        {
-            'id': 2,
-            'name': "Enterotoxemia (Overeating Disease)",
-            'symptoms': ["sudden death", "abdominal pain", "diarrhea", "convulsions", "bloating"],
-            'description': "Caused by Clostridium perfringens bacteria that produce toxins in the intestine.",
-            'severity': "Critical",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Antitoxin, antibiotics, anti-inflammatories as prescribed by vet."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Oral electrolytes, IV fluids, reduce feed intake temporarily."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Vaccination, gradual diet changes, avoid overfeeding grain."
-                }
-            ]
-        },
-        {
-            'id': 3,
-            'name': "Coccidiosis",
-            'symptoms': ["diarrhea", "weight loss", "dehydration", "weakness", "bloody stool"],
-            'description': "A parasitic disease caused by protozoa affecting the intestinal tract.",
-            'severity': "Moderate",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Sulfa drugs, amprolium, or other coccidiostats as prescribed by a vet."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Fluids to prevent dehydration, electrolytes, good nutrition."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Clean housing, prevent overcrowding, good sanitation, coccidiostats in feed for prevention."
-                }
-            ]
-        }
-    ]
-}
-
-# Common symptoms for each animal type
-symptoms = {
-    'cattle': [
-        "coughing", "nasal discharge", "fever", "reduced appetite", "labored breathing", 
-        "swollen udder", "abnormal milk", "pain in udder", "reduced milk production",
-        "blisters on mouth", "blisters on feet", "excessive salivation", "lameness",
-        "diarrhea", "weight loss", "dehydration", "weakness", "bloody stool"
-    ],
-    'goat': [
-        "joint swelling", "lameness", "weight loss", "pneumonia", "neurological symptoms",
-        "sudden death", "abdominal pain", "diarrhea", "convulsions", "bloating",
-        "dehydration", "weakness", "bloody stool", "fever", "coughing", "reduced appetite"
-    ]
-}
+# The served catalog: the CATALOG_PATH file when set, otherwise diseases.py
+def load_app_catalog():
+    if app.config['CATALOG_PATH']:
+        return open_catalog(app.config['CATALOG_PATH'])
+    return load_catalog(diseases.disease_database, diseases.symptoms)
 
-# Rule-based disease diagnostic system
-class LivestockHealthAdvisor:
-    def __init__(self):
-        self.disease_database = disease_database
-        self.symptoms = symptoms
-        
-    # Rule 1: Filter diseases based on selected symptoms
-    def filter_by_symptoms(self, animal_type, selected_symptoms):
-        if not selected_symptoms:
-            return self.disease_database[animal_type]
-            
-        filtered_diseases = []
-        for disease in self.disease_database[animal_type]:
-            # Check if any selected symptom matches the disease
-            if any(symptom in disease['symptoms'] for symptom in selected_symptoms):
-                filtered_diseases.append(disease)
-        
-        return filtered_diseases
-    
-    # Rule 2: Sort diseases by symptom match count (highest first)
-    def sort_by_match_count(self, diseases, selected_symptoms):
-        if not selected_symptoms:
-            return diseases
-            
-        # Count matching symptoms for each disease and sort
-        return sorted(
-            diseases,
-            key=lambda disease: sum(1 for s in selected_symptoms if s in disease['symptoms']),
-            reverse=True
-        )
-    
-    # Rule 3: Filter by search text in name, description, or symptoms
-    def filter_by_search_text(self, diseases, search_text):
-        if not search_text:
-            return diseases
-            
-        filtered_diseases = []
-        search_text = search_text.lower()
-        
-        for disease in diseases:
-            # Check if text is in disease name
-            if search_text in disease['name'].lower():
-                filtered_diseases.append(disease)
-                continue
-                
-            # Check if text is in description
-            if search_text in disease['description'].lower():
-                filtered_diseases.append(disease)
-                continue
-                
-            # Check if text is in any symptom
-            if any(search_text in symptom for symptom in disease['symptoms']):
-                filtered_diseases.append(disease)
-                continue
-                
-        return filtered_diseases
-    
-    # Rule 4: Identify critical conditions that require immediate veterinary attention
-    def flag_critical_conditions(self, diseases):
-        for disease in diseases:
-            if "Critical" in disease['severity']:
-                disease['urgent'] = True
-            else:
-                disease['urgent'] = False
-        return diseases
-    
-    # Rule 5: Calculate symptom coverage percentage
-    def calculate_symptom_coverage(self, diseases, selected_symptoms):
-        if not selected_symptoms:
-            for disease in diseases:
-                disease['symptom_coverage'] = 0
-            return diseases
-            
-        for disease in diseases:
-            matching_symptoms = [s for s in selected_symptoms if s in disease['symptoms']]
-            disease['matching_symptoms'] = matching_symptoms
-            disease['symptom_coverage'] = len(matching_symptoms) / len(selected_symptoms) * 100
-            
-        return diseases
-    
-    # Rule 6: Apply severity rating score
-    def apply_severity_rating(self, diseases):
-        severity_score = {
-            "Low": 1,
-            "Moderate": 2,
-            "Moderate to High": 3,
-            "High": 4,
-            "Critical": 5,
-            "Critical - Reportable Disease": 5
-        }
-        
-        for disease in diseases:
-            # Extract base severity without additional text
-            base_severity = disease['severity'].split(' - ')[0] if ' - ' in disease['severity'] else disease['severity']
-            disease['severity_score'] = severity_score.get(base_severity, 0)
-            
-        return diseases
-    
-    # Main search method that applies all rules
-    def search_diseases(self, animal_type, selected_symptoms, search_text):
-        # Apply rules in sequence
-        results = self.filter_by_symptoms(animal_type, selected_symptoms)
-        results = self.sort_by_match_count(results, selected_symptoms)
-        results = self.filter_by_search_text(results, search_text)
-        results = self.flag_critical_conditions(results)
-        results = self.calculate_symptom_coverage(results, selected_symptoms)
-        results = self.apply_severity_rating(results)
-        
-        return results
+# Same, re-importing diseases.py so edits to it are picked up
+def reload_app_catalog():
+    if not app.config['CATALOG_PATH']:
+        importlib.reload(diseases)
+    return load_app_catalog()
 
-# Initialize our health advisor
-health_advisor = LivestockHealthAdvisor()
+# Initialize our health advisor from the compiled catalog (see catalog.py)
+health_advisor = LivestockHealthAdvisor(load_app_catalog())
 
 # HTML Templates as strings
 
@@ -622,15 +528,15 @@ INDEX_TEMPLATE = '''
         </header>
         
         <div class="main-content">
-            <form action="/search" method="post" class="search-section">
+            <form action="/search" method="get" class="search-section">
                 <div class="animal-selector">
                     <div class="animal-type {% if animal_type == 'cattle' or not animal_type %}active{% endif %}" id="cattle-selector">
-                        <img src="/static/images/cows-3614642_1280.jpg" alt="Cattle">
+                        {{ responsive_image('cows-3614642_1280.jpg', 'Cattle', '80px') }}
                         <span>Cattle</span>
                         <input type="radio" name="animal_type" value="cattle" {% if animal_type == 'cattle' or not animal_type %}checked{% endif %} style="display: none;">
                     </div>
                     <div class="animal-type {% if animal_type == 'goat' %}active{% endif %}" id="goat-selector">
-                        <img src="/static/images/irish-goat-7429437_1280.jpg" alt="Goat">
+                        {{ responsive_image('irish-goat-7429437_1280.jpg', 'Goat', '80px') }}
                         <span>Goat</span>
                         <input type="radio" name="animal_type" value="goat" {% if animal_type == 'goat' %}checked{% endif %} style="display: none;">
                     </div>
@@ -811,6 +717,19 @@ RESULTS_TEMPLATE = '''
             margin-top: 10px;
             font-style: italic;
         }
+        .pagination {
+            display: flex;
+            align-items: center;
+            gap: 15px;
+            margin-top: 20px;
+        }
+        .page-button {
+            padding: 8px 16px;
+            background-color: #6c757d;
+            color: white;
+            text-decoration: none;
+            border-radius: 5px;
+        }
         .matching-symptoms {
             background-color: #e2f0d9;
             padding: 5px;
@@ -886,7 +805,7 @@ RESULTS_TEMPLATE = '''
                                 
                                 <div class="disease-details">
                                     <div class="disease-image">
-                                        <img src="/static/images/lame goat.jpg" alt="{{ disease.name }}">
+                                        {{ responsive_image('lame goat.jpg', disease.name, '150px') }}
                                     </div>
                                     <div class="disease-info">
                                         <div class="treatment-section">
@@ -903,6 +822,13 @@ RESULTS_TEMPLATE = '''
                             </div>
                         {% endfor %}
                     {% endif %}
+                    {% if prev_url or next_url %}
+                        <nav class="pagination">
+                            {% if prev_url %}<a href="{{ prev_url }}" class="page-button">« Previous</a>{% endif %}
+                            <span>Showing {{ first_result }}-{{ first_result + results|length - 1 }} of {{ total }} conditions</span>
+                            {% if next_url %}<a href="{{ next_url }}" class="page-button">Next »</a>{% endif %}
+                        </nav>
+                    {% endif %}
                 </div>
             </div>
         </div>
@@ -916,39 +842,396 @@ RESULTS_TEMPLATE = '''
 </html>
 '''
 
+# Compile each template source once, on first use, instead of on every request
+@functools.cache
+def compiled_template(source):
+    return app.jinja_env.from_string(source)
+
 @app.route('/')
 def index():
-    return render_template_string(
-        INDEX_TEMPLATE, 
-        cattle_symptoms=symptoms['cattle'], 
-        goat_symptoms=symptoms['goat'],
+    return render_template(
+        compiled_template(INDEX_TEMPLATE), 
+        cattle_symptoms=health_advisor.symptoms.get('cattle', ()), 
+        goat_symptoms=health_advisor.symptoms.get('goat', ()),
         animal_type='cattle'
     )
 
-@app.route('/search', methods=['POST'])
+# Rendered /search pages, their ETags, result totals and history results (first pages),
+# keyed by catalog version and query
+page_cache = LRUCache(app.config['PAGE_CACHE_SIZE'])
+
+# Symptom, combination and zero-result counts of /search, flushed as per-window aggregates
+os.makedirs(os.path.dirname(app.config['ANALYTICS_PATH']) or '.', exist_ok=True)
+query_analytics = QueryAnalytics(
+    app.config['ANALYTICS_TOP_SIZE'],
+    app.config['ANALYTICS_FLUSH_INTERVAL'],
+    sinks=[json_lines_sink(app.config['ANALYTICS_PATH'])]
+).start()
+atexit.register(query_analytics.flush)
+
+# Encode a page as the template renders it and send it in writes of at least chunk_size
+# bytes, except the first: the static head up to the first template variable goes out at
+# once. The page is cached under key, with its total and history results, once it has
+# been rendered in full.
+def stream_page(key, chunks, chunk_size, total, top_results):
+    body = []
+    sent = 0
+    pending = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        body.append(data)
+        pending += len(data)
+        if pending >= chunk_size or not sent:
+            yield b''.join(body[sent:])
+            sent = len(body)
+            pending = 0
+    if pending:
+        yield b''.join(body[sent:])
+    body = b''.join(body)
+    page_cache.put(key, (body, hashlib.sha256(body).hexdigest(), total, top_results))
+
+# The leading results of a first page, as stored in the diagnosis history
+def history_results(results):
+    return tuple(
+        {'id': result.disease.id, 'name': result.disease.name, 'symptom_coverage': round(result.symptom_coverage, 1)}
+        for result in results[:app.config['HISTORY_TOP_RESULTS']]
+    )
+
+# Queue a history row for a search by a logged-in user: once per diagnosis, on its first
+# page, so paging through the results adds nothing. The session is only consulted when a
+# cookie was sent, so anonymous pages don't vary by cookie.
+def record_search(animal_type, selected_symptoms, search_text, top_results, page_number):
+    if page_number != 1 or app.config['SESSION_COOKIE_NAME'] not in request.cookies or 'username' not in session:
+        return
+    diagnosis_history.put({
+        'username': session['username'],
+        'animal_type': animal_type,
+        'symptoms': selected_symptoms,
+        'search_text': search_text,
+        'top_results': list(top_results),
+        'created_at': datetime.now(timezone.utc)
+    })
+
+# Count a query in the analytics once, on its first page, and only for a known species.
+# Symptoms the species doesn't know are left out, so made-up strings can't push real
+# ones out of the heavy-hitter sketches.
+def count_query(animal_type, selected_symptoms, search_text, total, page_number, catalog):
+    if page_number == 1 and animal_type in catalog.diseases:
+        known_symptoms = catalog.species(animal_type).symptom_bits
+        query_analytics.record(
+            animal_type, [s for s in selected_symptoms if s in known_symptoms], search_text, total
+        )
+
+@app.route('/search', methods=['GET', 'POST'])
 def search():
-    # Get data from the form
-    animal_type = request.form.get('animal_type', 'cattle')
-    search_text = request.form.get('search_text', '')
-    selected_symptoms = request.form.getlist('symptoms')
-    
-    # Apply our rule-based system
-    results = health_advisor.search_diseases(animal_type, selected_symptoms, search_text)
-    
-    return render_template_string(
-        RESULTS_TEMPLATE, 
-        results=results, 
-        animal_type=animal_type, 
-        selected_symptoms=selected_symptoms
+    # Get data from the query string (GET) or the form (POST)
+    animal_type = request.values.get('animal_type', 'cattle')
+    search_text = request.values.get('search_text', '')
+    selected_symptoms = request.values.getlist('symptoms')
+    ranking = request.values.get('ranking', health_advisor.ranking)
+    if ranking not in RANKINGS:
+        abort(400)
+    page_number = max(request.values.get('page', 1, type=int), 1)
+    page_size = app.config['RESULTS_PAGE_SIZE']
+
+    # The page lists the selected symptoms in request order, so the key keeps that order.
+    # The page is rendered from the same catalog whose version is in the key.
+    catalog = health_advisor.catalog
+    key = (catalog.version, animal_type, tuple(selected_symptoms), search_text.lower(), ranking, page_number)
+    page = page_cache.get(key)
+    if page is None:
+        # Apply our rule-based system, building only the requested page of results
+        offset = (page_number - 1) * page_size
+        results, total = health_advisor.search_page(
+            animal_type, selected_symptoms, search_text, ranking, page_size, offset, catalog
+        )
+        # Past the last page (the first page always exists, even when it lists nothing)
+        if page_number > 1 and offset >= total:
+            abort(404)
+        top_results = history_results(results) if page_number == 1 else ()
+        count_query(animal_type, selected_symptoms, search_text, total, page_number, catalog)
+        record_search(animal_type, selected_symptoms, search_text, top_results, page_number)
+
+        def page_url(number):
+            return url_for('search', animal_type=animal_type, symptoms=selected_symptoms,
+                           search_text=search_text, ranking=ranking, page=number)
+
+        context = dict(
+            results=results, 
+            animal_type=animal_type, 
+            selected_symptoms=selected_symptoms,
+            total=total,
+            first_result=offset + 1,
+            prev_url=page_url(page_number - 1) if page_number > 1 else None,
+            next_url=page_url(page_number + 1) if offset + page_size < total else None
+        )
+        if app.config['STREAM_RESULTS']:
+            chunks = stream_template(compiled_template(RESULTS_TEMPLATE), **context)
+            response = app.response_class(stream_page(key, chunks, app.config['STREAM_CHUNK_SIZE'], total, top_results))
+            # No ETag until the page is complete; repeat requests get the cached copy with one
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+
+        body = render_template(compiled_template(RESULTS_TEMPLATE), **context).encode('utf-8')
+        page = (body, hashlib.sha256(body).hexdigest(), total, top_results)
+        page_cache.put(key, page)
+    else:
+        body, etag, total, top_results = page
+        count_query(animal_type, selected_symptoms, search_text, total, page_number, catalog)
+        # A revalidation (answered with a 304 below) is the same diagnosis seen again
+        if not request.if_none_match.contains(etag):
+            record_search(animal_type, selected_symptoms, search_text, top_results, page_number)
+
+    body, etag = page[:2]
+    response = make_response(body)
+    response.set_etag(etag)
+    # Shared caches may store the page but must revalidate; a matching
+    # If-None-Match on GET gets a 304 with no body
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Validate one JSON search query; returns ((animal_type, symptoms, search_text, ranking, limit, offset), None)
+# or (None, error)
+def parse_api_query(data):
+    if not isinstance(data, dict):
+        return None, 'query must be a JSON object'
+    animal_type = data.get('animal_type', 'cattle')
+    selected_symptoms = data.get('symptoms', [])
+    search_text = data.get('search_text', '')
+    ranking = data.get('ranking', health_advisor.ranking)
+    limit = data.get('limit', app.config['API_PAGE_SIZE'])
+    offset = data.get('offset', 0)
+    if animal_type not in health_advisor.disease_database:
+        return None, f'unknown animal_type {animal_type!r}'
+    if not isinstance(selected_symptoms, list) or not all(isinstance(s, str) for s in selected_symptoms):
+        return None, 'symptoms must be a list of strings'
+    if not isinstance(search_text, str):
+        return None, 'search_text must be a string'
+    if ranking not in RANKINGS:
+        return None, f'ranking must be one of {", ".join(RANKINGS)}'
+    if type(limit) is not int or not 1 <= limit <= app.config['API_MAX_PAGE_SIZE']:
+        return None, f"limit must be an integer from 1 to {app.config['API_MAX_PAGE_SIZE']}"
+    if type(offset) is not int or offset < 0:
+        return None, 'offset must be a non-negative integer'
+    return (animal_type, selected_symptoms, search_text, ranking, limit, offset), None
+
+# JSON search: GET with query parameters, or POST with a JSON object
+@app.route('/api/search', methods=['GET', 'POST'])
+def api_search():
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+    else:
+        data = {
+            'animal_type': request.args.get('animal_type', 'cattle'),
+            'symptoms': request.args.getlist('symptoms'),
+            'search_text': request.args.get('search_text', ''),
+            'ranking': request.args.get('ranking', health_advisor.ranking),
+            'limit': request.args.get('limit', app.config['API_PAGE_SIZE'], type=int),
+            'offset': request.args.get('offset', 0, type=int)
+        }
+    query, error = parse_api_query(data)
+    if error:
+        return jsonify(error=error), 400
+
+    results, total = health_advisor.search_page(*query)
+    return jsonify(api_page(query, results, total))
+
+# JSON answer for one page of a parsed query
+def api_page(query, results, total):
+    animal_type, selected_symptoms, search_text, ranking, limit, offset = query
+    return {
+        'animal_type': animal_type,
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'results': [result.to_dict() for result in results]
+    }
+
+# Batch JSON search: {"queries": [{"animal_type": ..., "symptoms": [...], "search_text": ...,
+# "ranking": ..., "limit": ..., "offset": ...}, ...]}
+# answered in order, with a per-query error for invalid entries
+@app.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('queries'), list):
+        return jsonify(error='body must be a JSON object with a "queries" list'), 400
+    if len(data['queries']) > app.config['API_BATCH_LIMIT']:
+        return jsonify(error=f"at most {app.config['API_BATCH_LIMIT']} queries per batch"), 400
+
+    parsed = [parse_api_query(entry) for entry in data['queries']]
+    valid_queries = [query for query, error in parsed if query is not None]
+    batch_pages = iter(health_advisor.search_many(valid_queries))
+
+    answers = []
+    for query, error in parsed:
+        if error:
+            answers.append({'error': error})
+        else:
+            answers.append(api_page(query, *next(batch_pages)))
+    return jsonify(answers=answers)
+
+# Streaming herd diagnosis: POST a CSV (text/csv) or NDJSON body of per-animal records
+# (see records.py) and read back one NDJSON line per animal, HERD_STREAM_BATCH animals at a time.
+# The body is parsed a line at a time, so memory use does not depend on the upload size.
+@app.route('/api/herd/stream', methods=['POST'])
+def api_herd_stream():
+    record_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if record_format not in RECORD_FORMATS:
+        return jsonify(error=f'format must be one of {", ".join(RECORD_FORMATS)}'), 400
+    default_animal_type = request.args.get('animal_type', 'cattle')
+    limit = min(max(request.args.get('limit', 3, type=int), 1), app.config['API_MAX_PAGE_SIZE'])
+
+    def diagnose():
+        entries = read_records(decode_lines(request.stream), record_format, default_animal_type)
+        while batch := list(islice(entries, app.config['HERD_STREAM_BATCH'])):
+            for answer in health_advisor.diagnose_records(batch, limit):
+                yield json.dumps(answer, separators=(',', ':')) + '\n'
+
+    response = app.response_class(stream_with_context(diagnose()), mimetype='application/x-ndjson')
+    # Ask proxies not to buffer, so each line reaches the client as it is produced
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Only requests carrying "Authorization: Bearer <ADMIN_TOKEN>" reach an /admin view
+def admin_required(view):
+    @functools.wraps(view)
+    def guarded(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        supplied = request.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            abort(403)
+        return view(*args, **kwargs)
+    return guarded
+
+# Search result and rendered page cache counters
+@app.route('/admin/cache-stats')
+@admin_required
+def cache_stats():
+    return jsonify(
+        results=health_advisor.result_cache.stats() if health_advisor.result_cache is not None else None,
+        pages=page_cache.stats()
+    )
+
+# Diagnosis history write-behind queue: rows queued and batched, high-water mark,
+# rows written, dropped and failed
+@app.route('/admin/history-queue')
+@admin_required
+def history_queue_stats():
+    return jsonify(diagnosis_history.stats())
+
+# Most queried symptoms, symptom combinations and zero-result queries of this worker
+# since it started, for every species or ?animal_type=; ?limit= entries per list
+@app.route('/admin/query-analytics')
+@admin_required
+def query_analytics_report():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), app.config['ANALYTICS_TOP_SIZE'])
+    return jsonify(query_analytics.report(request.args.get('animal_type'), limit))
+
+# Hot reload: rebuild the catalog when its source file changes and swap it in without
+# a restart. Every worker process watches for itself; POST /admin/catalog/reload
+# reloads the worker that receives it immediately.
+catalog_reloader = CatalogReloader(
+    health_advisor,
+    reload_app_catalog,
+    [app.config['CATALOG_PATH'] or diseases.__file__],
+    interval=app.config['CATALOG_RELOAD_INTERVAL'],
+    # Pages cached under the previous version can never be served again
+    on_swap=[lambda previous, catalog: page_cache.clear()]
+)
+if app.config['CATALOG_RELOAD_INTERVAL'] > 0:
+    catalog_reloader.start()
+
+# Version being served and reload counters
+@app.route('/admin/catalog')
+@admin_required
+def catalog_status():
+    return jsonify(catalog_reloader.stats())
+
+@app.route('/admin/catalog/reload', methods=['POST'])
+@admin_required
+def reload_catalog():
+    try:
+        previous_version, version = catalog_reloader.reload()
+    except Exception:
+        return jsonify(error=catalog_reloader.last_error, version=health_advisor.catalog.version), 500
+    return jsonify(previous_version=previous_version, version=version, changed=previous_version != version)
+
+# Fingerprinted static assets (static/ and images/, deduplicated by content)
+asset_manifest = AssetManifest()
+
+@app.template_global()
+def asset_url(filename):
+    return asset_manifest.url(filename)
+
+# <picture> with WebP and JPEG srcsets so browsers fetch only the size they display.
+# Falls back to the original image when no derivatives can be built (no Pillow).
+@app.template_global()
+def responsive_image(filename, alt, sizes):
+    widths = images.derived_widths(filename)
+    if not widths:
+        return Markup('<img src="{}" alt="{}">').format(asset_url(filename), alt)
+    version = asset_manifest.digest(filename)
+    return Markup(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}">'
+        '</picture>'
+    ).format(
+        images.srcset(filename, 'webp', version), sizes,
+        images.derived_url(filename, widths[-1], 'jpg', version),
+        images.srcset(filename, 'jpg', version), sizes, alt
     )
 
-# For serving static files in development (would need proper setup for production)
+# Send a file with a content-hash ETag. Conditional requests carrying that ETag
+# are answered with a 304 without opening the file; otherwise send_file hands
+# the file to the server's zero-copy file wrapper (or X-Sendfile when enabled).
+def send_asset(path, digest, immutable):
+    if request.if_none_match.contains(digest):
+        response = app.response_class(status=304)
+    else:
+        response = send_file(path, etag=False, conditional=False)
+    response.set_etag(digest)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/assets/<path:name>')
+def serve_asset(name):
+    found = asset_manifest.resolve(name)
+    if found is None:
+        abort(404)
+    path, digest = found
+    # A fingerprinted URL always names the same bytes, so it never needs revalidating
+    return send_asset(path, digest, immutable=True)
+
+# Resized image derivatives, built on first request if the build step hasn't made them
+@app.route('/static/derived/<path:filename>')
+def derived_image(filename):
+    source = images.derivative_source(filename)
+    if source is None:
+        abort(404)
+    path = images.build_derivative(*source)
+    # Derivatives requested with the current version of their source never change
+    version = asset_manifest.digest(source[0])
+    immutable = version is not None and request.args.get('v') == version
+    return send_asset(path, f'{version}-{source[1]}{source[2]}', immutable)
+
+# Unversioned image URLs, kept for old links; served from the asset manifest
 @app.route('/static/images/<path:filename>')
 def serve_image(filename):
-    from flask import send_from_directory
-    import os
-    # This is only for demo purposes - you'd need to set up proper static file serving for production
-    return send_from_directory(os.path.join(app.root_path, 'static', 'images'), filename)
+    found = asset_manifest.resolve_original(filename)
+    if found is None:
+        abort(404)
+    path, digest = found
+    return send_asset(path, digest, immutable=False)
 
 if __name__ == '__main__':
     import os
@@ -0,0 +1,74 @@
+# Content-hashed static assets.
+#
+# Every file in the asset directories is fingerprinted with a hash of its
+# content and published as /assets/<stem>.<hash><ext>. Because a URL can only
+# ever name one version of a file, responses can be cached forever, and files
+# with identical content (the images/ and static/ copies) are stored once.
+
+import hashlib
+import os
+from urllib.parse import quote
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Searched in order; when two directories hold a file of the same name the first wins
+ASSET_DIRS = ('static', 'images')
+
+ASSET_URL = '/assets/'
+
+# One year, the conventional maximum for immutable responses
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def content_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class AssetManifest:
+    def __init__(self, root=ROOT_DIR, directories=ASSET_DIRS):
+        # content digest -> path of the one copy served for it
+        self.paths = {}
+        # original filename -> digest
+        self.digests = {}
+        # fingerprinted name -> digest
+        self.fingerprints = {}
+        for directory in directories:
+            directory_path = os.path.join(root, directory)
+            if not os.path.isdir(directory_path):
+                continue
+            for filename in sorted(os.listdir(directory_path)):
+                path = os.path.join(directory_path, filename)
+                if not os.path.isfile(path):
+                    continue
+                digest = content_digest(path)
+                self.paths.setdefault(digest, path)
+                self.digests.setdefault(filename, digest)
+                self.fingerprints[fingerprint(filename, digest)] = digest
+
+    # Content digest of an asset by its original filename
+    def digest(self, filename):
+        return self.digests.get(filename)
+
+    # Fingerprinted URL of an asset by its original filename
+    def url(self, filename):
+        return ASSET_URL + quote(fingerprint(filename, self.digests[filename]))
+
+    # (path, digest) for a fingerprinted name, or None
+    def resolve(self, fingerprinted_name):
+        digest = self.fingerprints.get(fingerprinted_name)
+        if digest is None:
+            return None
+        return self.paths[digest], digest
+
+    # (path, digest) for an original filename, or None
+    def resolve_original(self, filename):
+        digest = self.digests.get(filename)
+        if digest is None:
+            return None
+        return self.paths[digest], digest
+
+
+def fingerprint(filename, digest):
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{digest}{ext}'
@@ -0,0 +1,276 @@
+# Performance benchmarks for the Livestock Health Advisor.
+#
+# Usage: python benchmark.py [name ...]   (runs every benchmark when no name is given)
+
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+
+# Best-of-repeat time per call, in microseconds
+def time_per_call(func, number=1000, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def report(label, before, after):
+    print(f'  {label:<28} before {before:9.1f} us   after {after:9.1f} us   ({before / after:.1f}x)')
+
+
+# Per-request template cost: render_template_string (parse + compile + render)
+# against rendering the template compiled once and cached by compiled_template
+def bench_templates():
+    from flask import render_template, render_template_string
+    import app as web
+
+    selected_symptoms = ['fever', 'coughing']
+    results = web.health_advisor.search_diseases('cattle', selected_symptoms, '')
+    context = dict(results=results, animal_type='cattle', selected_symptoms=selected_symptoms)
+
+    print('templates: per-request render cost')
+    with web.app.test_request_context('/search'):
+        before = time_per_call(lambda: render_template_string(web.RESULTS_TEMPLATE, **context), number=200)
+        after = time_per_call(lambda: render_template(web.compiled_template(web.RESULTS_TEMPLATE), **context), number=200)
+        report('results page', before, after)
+
+
+SYLLABLES = ('ba', 'ko', 'ri', 'tu', 'me', 'sa', 'lo', 'ni', 'vy', 'da', 'pe', 'gu', 'ha', 'zo', 'fi', 'ne')
+
+
+def pseudo_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+# A disease_database/symptoms pair shaped like diseases.py, with n_diseases spread
+# over n_species species that each draw on their own pool of symptoms
+def synthetic_source(n_diseases, n_species=20, symptoms_per_species=300, seed=0):
+    from catalog import SEVERITY_SCORES
+
+    rng = random.Random(seed)
+    disease_database = {}
+    symptoms = {}
+    for species in range(n_species):
+        animal_type = f'species{species}'
+        pool = sorted({f'{pseudo_word(rng)} {pseudo_word(rng)}' for _ in range(symptoms_per_species)})
+        symptoms[animal_type] = pool[:20]
+        disease_database[animal_type] = [
+            {
+                'id': disease_id,
+                'name': f'{pseudo_word(rng).title()} {pseudo_word(rng)} disease',
+                'symptoms': rng.sample(pool, rng.randint(3, 8)),
+                'description': ' '.join(pseudo_word(rng) for _ in range(12)),
+                'severity': rng.choice(list(SEVERITY_SCORES)),
+                'treatments': [
+                    {'type': treatment_type, 'details': ' '.join(pseudo_word(rng) for _ in range(8))}
+                    for treatment_type in ('Medication', 'Prevention')
+                ]
+            }
+            for disease_id in range(species, n_diseases, n_species)
+        ]
+    return disease_database, symptoms
+
+
+# Search latency against catalog size: 10^2 to 10^5 diseases in a SQLite catalog.
+# Opening reads no diseases; the first query of a species loads and indexes it.
+# "page" is a browse of the whole species (no symptoms, no text) limited to 20 results.
+def bench_catalog_scale():
+    from advisor import LivestockHealthAdvisor
+    from catalog import compile_catalog, open_catalog, write_catalog
+
+    print('catalog scale: SQLite backend, 20 species, latency per search')
+    print(f"  {'diseases':>9} {'open':>9} {'1st query':>10} {'symptoms':>10} {'text':>10} {'fuzzy':>10} {'page':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n_diseases in (100, 1000, 10000, 100000):
+            disease_database, symptoms = synthetic_source(n_diseases)
+            path = os.path.join(directory, f'catalog-{n_diseases}.db')
+            write_catalog(compile_catalog(disease_database, symptoms), path)
+
+            start = time.perf_counter()
+            advisor = LivestockHealthAdvisor(open_catalog(path), cache_size=0)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            # Queries built from one disease of the first species: three of its symptoms,
+            # a word of its name, and the same word with one letter changed
+            disease = disease_database['species0'][-1]
+            selected_symptoms = disease['symptoms'][:3]
+            word = disease['name'].split()[1]
+            typo = word[:-1] + ('x' if word[-1] != 'x' else 'y')
+
+            start = time.perf_counter()
+            advisor.search_diseases('species0', selected_symptoms, '')
+            load_ms = (time.perf_counter() - start) * 1000
+
+            symptom_us = time_per_call(lambda: advisor.search_diseases('species0', selected_symptoms, ''), number=200)
+            text_us = time_per_call(lambda: advisor.search_diseases('species0', [], word), number=200)
+            fuzzy_us = time_per_call(lambda: advisor.search_diseases('species0', [], typo), number=50)
+            page_us = time_per_call(lambda: advisor.search_diseases('species0', [], '', limit=20), number=200)
+            print(f'  {n_diseases:>9} {open_ms:>7.1f}ms {load_ms:>8.1f}ms '
+                  f'{symptom_us:>8.1f}us {text_us:>8.1f}us {fuzzy_us:>8.1f}us {page_us:>8.1f}us')
+
+
+# Time to first byte and to the last byte of an uncached /search page (a full page of
+# cards), rendered in full before sending against streamed as the template produces it
+def bench_ttfb(number=200):
+    from werkzeug.test import EnvironBuilder
+    import app as web
+
+    environ = EnvironBuilder(path='/search', query_string={'animal_type': 'cattle'}).get_environ()
+
+    # Median (first byte, last byte) in milliseconds over number requests
+    def request_times():
+        first_times = []
+        last_times = []
+        for _ in range(number):
+            web.page_cache.clear()
+            web.health_advisor.result_cache.clear()
+            start = time.perf_counter()
+            body = web.app(dict(environ), lambda status, headers: None)
+            chunks = iter(body)
+            next(chunks)
+            first_times.append((time.perf_counter() - start) * 1000)
+            for _ in chunks:
+                pass
+            last_times.append((time.perf_counter() - start) * 1000)
+            body.close()
+        return sorted(first_times)[number // 2], sorted(last_times)[number // 2]
+
+    print('ttfb: uncached /search page')
+    streaming = web.app.config['STREAM_RESULTS']
+    try:
+        web.app.config['STREAM_RESULTS'] = False
+        buffered_first, buffered_last = request_times()
+        web.app.config['STREAM_RESULTS'] = True
+        streamed_first, streamed_last = request_times()
+    finally:
+        web.app.config['STREAM_RESULTS'] = streaming
+    print(f'  {"":<10} {"first byte":>12} {"last byte":>12}')
+    print(f'  {"buffered":<10} {buffered_first:>10.2f}ms {buffered_last:>10.2f}ms')
+    print(f'  {"streamed":<10} {streamed_first:>10.2f}ms {streamed_last:>10.2f}ms')
+
+
+# /search latency while logins hash passwords in the background: each of `logins`
+# threads checks passwords back to back, either inline as a request thread used to or
+# through the app's bounded PasswordHasher
+def bench_login_load(logins=8, number=200):
+    import threading
+    from werkzeug.security import check_password_hash
+    import app as web
+
+    password_hash = web.password_hasher.hash('correct horse')
+    client = web.app.test_client()
+
+    # Median and 95th percentile /search time in milliseconds with login(password_hash, password)
+    # running in the threads
+    def search_latency(login=None):
+        stop = threading.Event()
+
+        def log_in():
+            while not stop.is_set():
+                try:
+                    login(password_hash, 'wrong horse')
+                except web.HashingBusy:
+                    time.sleep(0.01)
+
+        threads = [threading.Thread(target=log_in) for _ in range(logins if login else 0)]
+        for thread in threads:
+            thread.start()
+        try:
+            times = []
+            for _ in range(number):
+                web.page_cache.clear()
+                start = time.perf_counter()
+                client.get('/search?animal_type=cattle&symptoms=fever&symptoms=coughing').close()
+                times.append((time.perf_counter() - start) * 1000)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        times.sort()
+        return times[number // 2], times[number * 95 // 100]
+
+    print(f'login_load: /search latency with {logins} threads logging in '
+          f'({web.app.config["PASSWORD_HASH_METHOD"]}, {web.app.config["PASSWORD_HASH_WORKERS"]} hashing workers)')
+    print(f'  {"":<16} {"median":>10} {"p95":>10}')
+    for label, login in (('no logins', None), ('inline hashing', check_password_hash),
+                         ('PasswordHasher', web.password_hasher.check)):
+        median, p95 = search_latency(login)
+        print(f'  {label:<16} {median:>8.2f}ms {p95:>8.2f}ms')
+
+
+# register/login throughput of the users.db store with `threads` concurrent requests:
+# the previous setup (default rollback journal and pool, username and email checked in
+# two queries) against the app's (WAL and pragmas, sized pool, one query backed by the
+# unique constraints). Password hashing is left out; see login_load.
+def bench_user_store(threads=8, users=2000, logins=8000):
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine, event, select
+    from sqlalchemy.orm import Session
+    import app as web
+
+    password_hash = web.password_hasher.hash('correct horse')
+
+    def register_before(session, username, email):
+        if session.scalars(select(web.User).filter_by(username=username)).first():
+            return
+        if session.scalars(select(web.User).filter_by(email=email)).first():
+            return
+        session.add(web.User(username=username, email=email, password_hash=password_hash))
+        session.commit()
+
+    def register_after(session, username, email):
+        if web.registration_conflict(session, username, email) is None:
+            web.create_user(session, username, email, password_hash)
+
+    # Operations per second registering users, logging them in, and both at once (one
+    # registration to four logins)
+    def throughput(engine, register):
+        web.db.metadata.create_all(engine)
+
+        def run(task):
+            kind, number = task
+            with Session(engine) as session:
+                if kind == 'register':
+                    register(session, f'user{number}', f'user{number}@example.com')
+                else:
+                    web.find_user(session, f'user{number % users}')
+
+        phases = (
+            [('register', number) for number in range(users)],
+            [('login', number) for number in range(logins)],
+            [('register', users + number // 5) if number % 5 == 0 else ('login', number) for number in range(logins)]
+        )
+        rates = []
+        with ThreadPoolExecutor(threads) as executor:
+            for tasks in phases:
+                start = time.perf_counter()
+                list(executor.map(run, tasks))
+                rates.append(len(tasks) / (time.perf_counter() - start))
+        engine.dispose()
+        return rates
+
+    print(f'user_store: users.db operations per second, {threads} threads')
+    print(f'  {"":<8} {"register":>10} {"login":>10} {"mixed":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        before = create_engine(f'sqlite:///{os.path.join(directory, "before.db")}')
+        after = create_engine(f'sqlite:///{os.path.join(directory, "after.db")}', **web.app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        event.listen(after, 'connect', web.set_user_db_pragmas)
+        for label, engine, register in (('before', before, register_before), ('after', after, register_after)):
+            print(f'  {label:<8}' + ''.join(f' {rate:>8.0f}/s' for rate in throughput(engine, register)))
+
+
+BENCHMARKS = {
+    'templates': bench_templates,
+    'catalog_scale': bench_catalog_scale,
+    'ttfb': bench_ttfb,
+    'login_load': bench_login_load,
+    'user_store': bench_user_store,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.exit(f"Unknown benchmark {name!r}; choose from {', '.join(BENCHMARKS)}")
+        BENCHMARKS[name]()
@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+
+# Size-bounded, thread-safe LRU cache with hit/miss/eviction counters
+class LRUCache:
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Cached value for key, or default (counts as a miss)
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
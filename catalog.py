@@ -0,0 +1,527 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+from collections.abc import Mapping
+from contextlib import closing
+from pathlib import Path
+
+from search_index import FuzzyIndex, TextIndex
+
+# Bump when the layout of the compiled catalog changes
+CATALOG_FORMAT = 2
+
+# Default location of the compiled catalog, next to this module
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json')
+
+# Catalog files with these extensions are SQLite databases; anything else is JSON
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Bytes of a SQLite catalog file mapped into memory instead of read through the page cache
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+# Severity scores used by Rule 6
+SEVERITY_SCORES = {
+    "Low": 1,
+    "Moderate": 2,
+    "Moderate to High": 3,
+    "High": 4,
+    "Critical": 5,
+    "Critical - Reportable Disease": 5
+}
+
+def severity_rating(severity):
+    # Extract base severity without additional text
+    base_severity = severity.split(' - ')[0] if ' - ' in severity else severity
+    return SEVERITY_SCORES.get(base_severity, 0)
+
+
+# Base class for immutable, slotted catalog records
+class Record:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} records are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} records are immutable')
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class Treatment(Record):
+    __slots__ = ('type', 'details')
+
+    def __init__(self, type, details):
+        object.__setattr__(self, 'type', sys.intern(type))
+        object.__setattr__(self, 'details', details)
+
+
+class Disease(Record):
+    __slots__ = (
+        'id', 'name', 'symptoms', 'symptom_set', 'description', 'severity', 'treatments',
+        'symptom_mask', 'severity_score', 'urgent', 'search_name', 'search_description'
+    )
+
+    def __init__(self, id, name, symptoms, description, severity, treatments,
+                 symptom_mask, severity_score, urgent, search_name, search_description):
+        symptoms = tuple(sys.intern(symptom) for symptom in symptoms)
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'symptoms', symptoms)
+        object.__setattr__(self, 'symptom_set', frozenset(symptoms))
+        object.__setattr__(self, 'description', description)
+        object.__setattr__(self, 'severity', sys.intern(severity))
+        object.__setattr__(self, 'treatments', tuple(treatments))
+        object.__setattr__(self, 'symptom_mask', symptom_mask)
+        object.__setattr__(self, 'severity_score', severity_score)
+        object.__setattr__(self, 'urgent', urgent)
+        object.__setattr__(self, 'search_name', search_name)
+        object.__setattr__(self, 'search_description', search_description)
+
+    # Build a record from one compiled disease entry; symptom_bits maps the
+    # species' symptoms to the bits of symptom_mask
+    @classmethod
+    def from_compiled(cls, entry, symptom_names, symptom_bits):
+        symptoms = [symptom_names[symptom_id] for symptom_id in entry['symptom_ids']]
+        symptom_mask = 0
+        for symptom in symptoms:
+            symptom_mask |= symptom_bits[symptom]
+        return cls(
+            entry['id'],
+            entry['name'],
+            symptoms,
+            entry['description'],
+            entry['severity'],
+            [Treatment(treatment_type, details) for treatment_type, details in entry['treatments']],
+            symptom_mask,
+            entry['severity_score'],
+            entry['urgent'],
+            entry['search_name'],
+            entry['search_description']
+        )
+
+
+# Per-request view of a disease carrying the fields computed by the rules.
+# Catalog fields (name, symptoms, treatments, ...) are read through from the record.
+class DiseaseResult:
+    __slots__ = ('disease', 'urgent', 'matching_symptoms', 'symptom_coverage', 'severity_score')
+
+    def __init__(self, disease, urgent=False, matching_symptoms=None, symptom_coverage=0, severity_score=0):
+        self.disease = disease
+        self.urgent = urgent
+        self.matching_symptoms = matching_symptoms if matching_symptoms is not None else []
+        self.symptom_coverage = symptom_coverage
+        self.severity_score = severity_score
+
+    def __getattr__(self, name):
+        if name == 'disease' or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.disease, name)
+
+    def __repr__(self):
+        return f'<DiseaseResult {self.disease.name!r} coverage={self.symptom_coverage}>'
+
+    # Compact JSON-serializable form used by the search API
+    def to_dict(self):
+        return {
+            'id': self.disease.id,
+            'name': self.disease.name,
+            'severity': self.disease.severity,
+            'severity_score': self.severity_score,
+            'urgent': self.urgent,
+            'symptom_coverage': round(self.symptom_coverage, 1),
+            'matching_symptoms': list(self.matching_symptoms),
+            'treatments': [{'type': treatment.type, 'details': treatment.details} for treatment in self.disease.treatments]
+        }
+
+
+# Version of a catalog source: a hash of its canonical JSON form
+def source_version(disease_database, symptoms):
+    source = json.dumps([disease_database, symptoms], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+
+# Compile the disease_database/symptoms literals into a JSON-serializable catalog
+# with severity scores, urgency, symptom ids and search fields resolved
+def compile_catalog(disease_database, symptoms):
+    # Every known symptom gets one id, shared across species
+    symptom_ids = {}
+    for animal_type, diseases in disease_database.items():
+        for symptom in symptoms.get(animal_type, []):
+            symptom_ids.setdefault(symptom, len(symptom_ids))
+        for disease in diseases:
+            for symptom in disease['symptoms']:
+                symptom_ids.setdefault(symptom, len(symptom_ids))
+
+    species = {}
+    for animal_type, diseases in disease_database.items():
+        compiled_diseases = []
+        for disease in diseases:
+            compiled_diseases.append({
+                'id': disease['id'],
+                'name': disease['name'],
+                'description': disease['description'],
+                'severity': disease['severity'],
+                'severity_score': severity_rating(disease['severity']),
+                'urgent': "Critical" in disease['severity'],
+                'search_name': disease['name'].lower(),
+                'search_description': disease['description'].lower(),
+                'symptom_ids': [symptom_ids[symptom] for symptom in disease['symptoms']],
+                'treatments': [[treatment['type'], treatment['details']] for treatment in disease['treatments']]
+            })
+        species[animal_type] = {
+            'symptoms': [symptom_ids[symptom] for symptom in symptoms.get(animal_type, [])],
+            'diseases': compiled_diseases
+        }
+
+    return {
+        'format': CATALOG_FORMAT,
+        'version': source_version(disease_database, symptoms),
+        'symptom_names': list(symptom_ids),
+        'species': species
+    }
+
+
+# One species of a catalog: immutable records plus the indexes the rules search
+class SpeciesCatalog:
+    def __init__(self, compiled_species, symptom_names):
+        self.symptoms = tuple(symptom_names[symptom_id] for symptom_id in compiled_species['symptoms'])
+
+        # Bits are numbered per species, so masks are only as wide as its own symptom vocabulary
+        self.symptom_bits = {}
+        for symptom in self.symptoms:
+            self.symptom_bits.setdefault(symptom, 1 << len(self.symptom_bits))
+        for entry in compiled_species['diseases']:
+            for symptom_id in entry['symptom_ids']:
+                self.symptom_bits.setdefault(symptom_names[symptom_id], 1 << len(self.symptom_bits))
+
+        self.diseases = tuple(
+            Disease.from_compiled(entry, symptom_names, self.symptom_bits) for entry in compiled_species['diseases']
+        )
+
+        self.positions = {disease: position for position, disease in enumerate(self.diseases)}
+
+        # symptom -> bitset of disease positions in diseases
+        self.symptom_index = {}
+        for position, disease in enumerate(self.diseases):
+            for symptom in disease.symptom_set:
+                self.symptom_index[symptom] = self.symptom_index.get(symptom, 0) | (1 << position)
+        # Bitset of the diseases Rule 4 flags as urgent
+        self.urgent_mask = 0
+        for position, disease in enumerate(self.diseases):
+            if disease.urgent:
+                self.urgent_mask |= 1 << position
+
+        # Bayesian ranking weights. A disease is taken to show each of its listed symptoms,
+        # and a symptom's background rate is the share of the species' diseases showing it,
+        # n / (N + 1). The log likelihood ratio of a matched symptom is then log((N + 1) / n):
+        # high for a symptom specific to one disease, near zero for one most diseases share.
+        self.symptom_log_likelihoods = {
+            symptom: math.log((len(self.diseases) + 1) / posting.bit_count())
+            for symptom, posting in self.symptom_index.items()
+        }
+
+        # Full-text index over the Rule 3 fields; the treatment index is built on first use
+        self.text_index = TextIndex(
+            (disease, (disease.search_name, disease.search_description) + disease.symptoms)
+            for disease in self.diseases
+        )
+        self.treatment_index = None
+        # Typo-tolerant index over the words of disease names and symptoms
+        self.fuzzy_index = FuzzyIndex((disease, (disease.name,) + disease.symptoms) for disease in self.diseases)
+
+    # Full-text index over treatment details, built the first time a search includes
+    # treatments. Two threads may both build it; either copy is correct.
+    def load_treatment_index(self):
+        treatment_index = self.treatment_index
+        if treatment_index is None:
+            treatment_index = self.treatment_index = TextIndex(
+                (disease, tuple(treatment.details.lower() for treatment in disease.treatments))
+                for disease in self.diseases
+            )
+        return treatment_index
+
+    # Rule 1 candidates as a bitset of positions: the diseases with any of the symptoms,
+    # or all of them when none are given
+    def candidate_mask(self, symptom_list):
+        if not symptom_list:
+            return (1 << len(self.diseases)) - 1
+        candidates = 0
+        for symptom in symptom_list:
+            candidates |= self.symptom_index.get(symptom, 0)
+        return candidates
+
+    # Encode a list of symptoms as a bitset (symptoms unknown to the species match nothing)
+    def symptom_mask(self, symptom_list):
+        mask = 0
+        for symptom in symptom_list:
+            mask |= self.symptom_bits.get(symptom, 0)
+        return mask
+
+    # Diseases whose name, description or symptoms contain the (lowercase) search text,
+    # optionally also matching on treatment details. With fuzzy=True a search that
+    # finds nothing falls back to typo-tolerant matching on names and symptoms.
+    def search_text(self, search_text, include_treatments=False, fuzzy=False):
+        matches = self.text_index.search(search_text)
+        if include_treatments:
+            matches |= self.load_treatment_index().search(search_text)
+        if fuzzy and not matches:
+            matches = {disease for distance, disease in self.fuzzy_index.search(search_text)}
+        return matches
+
+    # The same matches as a bitset of positions in diseases (the text indexes share that order)
+    def search_text_mask(self, search_text, include_treatments=False, fuzzy=False):
+        mask = self.text_index.search_mask(search_text)
+        if include_treatments:
+            mask |= self.load_treatment_index().search_mask(search_text)
+        if fuzzy and not mask:
+            for distance, disease in self.fuzzy_index.search(search_text):
+                mask |= 1 << self.positions[disease]
+        return mask
+
+
+# Catalog backends store a compiled catalog and hand it out a species at a time.
+# A backend has version and symptom_names attributes, species_names() listing the
+# animal types in catalog order, and load_species(animal_type) returning that
+# species' compiled form ({'symptoms': [...], 'diseases': [...]}).
+
+# Backend over a compiled catalog held in memory: compile_catalog output or a parsed JSON file
+class DictBackend:
+    def __init__(self, compiled):
+        if compiled.get('format') != CATALOG_FORMAT:
+            raise ValueError(f"Unsupported catalog format {compiled.get('format')!r}, expected {CATALOG_FORMAT}")
+        self.compiled = compiled
+        self.version = compiled['version']
+        self.symptom_names = compiled['symptom_names']
+
+    # Parse a JSON catalog file in a single read
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            return cls(json.loads(f.read()))
+
+    def species_names(self):
+        return list(self.compiled['species'])
+
+    def load_species(self, animal_type):
+        return self.compiled['species'][animal_type]
+
+
+SQLITE_SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE symptoms (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE species (name TEXT PRIMARY KEY, position INTEGER NOT NULL, symptoms TEXT NOT NULL);
+CREATE TABLE diseases (
+    species TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (species, position)
+) WITHOUT ROWID;
+'''
+
+
+def read_meta(connection):
+    return dict(connection.execute('SELECT key, value FROM meta'))
+
+
+# Backend over a SQLite catalog file, for catalogs too large to parse whole on startup.
+# Opening it reads only the symptom names and species list; each species' diseases
+# are read on first use, through a read-only connection that memory-maps the file.
+# The connection stays open for the backend's lifetime, so when the file is replaced
+# (catalogs are renamed into place) species still load from the file that was opened,
+# whose symptom ids match. A process forked after opening cannot share the connection:
+# it opens the path again and refuses a file holding another catalog version.
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = self.connect()
+        self.pid = os.getpid()
+        meta = read_meta(self.connection)
+        if meta.get('format') != str(CATALOG_FORMAT):
+            self.connection.close()
+            raise ValueError(f"Unsupported catalog format {meta.get('format')!r}, expected {CATALOG_FORMAT}")
+        self.version = meta['version']
+        self.symptom_names = [name for (name,) in self.connection.execute('SELECT name FROM symptoms ORDER BY id')]
+        self.names = [name for (name,) in self.connection.execute('SELECT name FROM species ORDER BY position')]
+
+    def connect(self):
+        connection = sqlite3.connect(
+            Path(self.path).resolve().as_uri() + '?mode=ro', uri=True, check_same_thread=False
+        )
+        connection.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+        return connection
+
+    def species_names(self):
+        return list(self.names)
+
+    def load_species(self, animal_type):
+        with self.lock:
+            if self.pid != os.getpid():
+                connection = self.connect()
+                version = read_meta(connection).get('version')
+                if version != self.version:
+                    connection.close()
+                    raise ValueError(f'{self.path} now holds catalog version {version}, not {self.version}')
+                self.connection = connection
+                self.pid = os.getpid()
+            row = self.connection.execute('SELECT symptoms FROM species WHERE name = ?', (animal_type,)).fetchone()
+            if row is None:
+                raise KeyError(animal_type)
+            entries = self.connection.execute(
+                'SELECT entry FROM diseases WHERE species = ? ORDER BY position', (animal_type,)
+            )
+            return {'symptoms': json.loads(row[0]), 'diseases': [json.loads(entry) for (entry,) in entries]}
+
+
+# Read-only mapping of animal type -> one field of its SpeciesCatalog; looking up
+# a species loads it, membership tests and iteration do not
+class SpeciesField(Mapping):
+    def __init__(self, catalog, field):
+        self.catalog = catalog
+        self.field = field
+
+    def __getitem__(self, animal_type):
+        return getattr(self.catalog.species(animal_type), self.field)
+
+    def __contains__(self, animal_type):
+        return animal_type in self.catalog.species_names
+
+    def __iter__(self):
+        return iter(self.catalog.species_names)
+
+    def __len__(self):
+        return len(self.catalog.species_names)
+
+
+# Immutable catalog over a backend. Each species is built on first use and then
+# shared by all requests; species that are never queried are never loaded.
+class Catalog:
+    def __init__(self, backend):
+        self.backend = backend
+        self.version = backend.version
+        self.symptom_names = [sys.intern(symptom) for symptom in backend.symptom_names]
+        self.species_names = tuple(backend.species_names())
+        self.loaded_species = {}
+        self.lock = threading.Lock()
+
+        # animal type -> diseases / form symptoms / symptom index of that species
+        self.diseases = SpeciesField(self, 'diseases')
+        self.symptoms = SpeciesField(self, 'symptoms')
+        self.symptom_index = SpeciesField(self, 'symptom_index')
+
+    # Compile straight from the source literals, skipping the artifact
+    @classmethod
+    def from_source(cls, disease_database, symptoms):
+        return cls(DictBackend(compile_catalog(disease_database, symptoms)))
+
+    # SpeciesCatalog for animal_type, loaded from the backend on first use
+    def species(self, animal_type):
+        species = self.loaded_species.get(animal_type)
+        if species is not None:
+            return species
+        if animal_type not in self.species_names:
+            raise KeyError(animal_type)
+        with self.lock:
+            species = self.loaded_species.get(animal_type)
+            if species is None:
+                species = SpeciesCatalog(self.backend.load_species(animal_type), self.symptom_names)
+                self.loaded_species[animal_type] = species
+        return species
+
+    # Load every species now rather than on first use
+    def load_all(self):
+        for animal_type in self.species_names:
+            self.species(animal_type)
+
+    def symptom_mask(self, animal_type, symptom_list):
+        return self.species(animal_type).symptom_mask(symptom_list)
+
+    def search_text(self, animal_type, search_text, include_treatments=False, fuzzy=False):
+        return self.species(animal_type).search_text(search_text, include_treatments, fuzzy)
+
+
+def write_json_catalog(compiled, path):
+    # Write to a temporary file first so readers never see a half-written catalog
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(compiled, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def write_sqlite_catalog(compiled, path):
+    # Build the database next to the target and rename it into place, as for JSON
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as connection:
+        connection.executescript(SQLITE_SCHEMA)
+        with connection:
+            connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+                ('format', str(CATALOG_FORMAT)),
+                ('version', compiled['version'])
+            ])
+            connection.executemany('INSERT INTO symptoms VALUES (?, ?)', enumerate(compiled['symptom_names']))
+            for position, (animal_type, species) in enumerate(compiled['species'].items()):
+                connection.execute(
+                    'INSERT INTO species VALUES (?, ?, ?)',
+                    (animal_type, position, json.dumps(species['symptoms']))
+                )
+                connection.executemany('INSERT INTO diseases VALUES (?, ?, ?)', (
+                    (animal_type, disease_position, json.dumps(entry, separators=(',', ':')))
+                    for disease_position, entry in enumerate(species['diseases'])
+                ))
+    os.replace(tmp_path, path)
+
+
+def is_sqlite_path(path):
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+# Write a compiled catalog as SQLite or JSON, by the file extension
+def write_catalog(compiled, path=CATALOG_PATH):
+    if is_sqlite_path(path):
+        write_sqlite_catalog(compiled, path)
+    else:
+        write_json_catalog(compiled, path)
+
+
+# Open a compiled catalog file (SQLite or JSON, by extension) as it is,
+# without comparing it to diseases.py; used for catalogs built elsewhere
+def open_catalog(path):
+    if is_sqlite_path(path):
+        return Catalog(SQLiteBackend(path))
+    return Catalog(DictBackend.from_file(path))
+
+
+# Load the compiled catalog in a single read. Falls back to compiling the source
+# literals when the artifact is missing, from another format, or older than the source.
+def load_catalog(disease_database, symptoms, path=CATALOG_PATH):
+    try:
+        with open(path, 'rb') as f:
+            compiled = json.loads(f.read())
+    except (OSError, ValueError):
+        compiled = None
+
+    if (compiled is None or compiled.get('format') != CATALOG_FORMAT
+            or compiled.get('version') != source_version(disease_database, symptoms)):
+        compiled = compile_catalog(disease_database, symptoms)
+
+    return Catalog(DictBackend(compiled))
+
+
+# Compile diseases.py into catalog.json: python catalog.py [output path]
+# (an output path ending in .db, .sqlite or .sqlite3 writes a SQLite catalog)
+if __name__ == '__main__':
+    from diseases import disease_database, symptoms
+
+    output_path = sys.argv[1] if len(sys.argv) > 1 else CATALOG_PATH
+    compiled = compile_catalog(disease_database, symptoms)
+    write_catalog(compiled, output_path)
+    print(f"Wrote catalog version {compiled['version']} to {output_path}")
@@ -0,0 +1,94 @@
+# Offline bulk diagnosis of per-animal symptom records.
+#
+# Usage: python diagnose.py INPUT OUTPUT [--format csv|ndjson] [--animal-type cattle]
+#                           [--limit 3] [--workers N] [--chunk-size 5000] [--catalog PATH]
+#
+# INPUT holds one animal per line (see records.py). OUTPUT receives one NDJSON
+# line per input record, in input order, in the format of /api/herd/stream.
+# Records are read lazily and diagnosed in chunks across a pool of worker
+# processes, each with its own advisor and result cache; with NumPy installed
+# each chunk is screened as a herd, species by species. Flask and SQLAlchemy
+# are never imported.
+
+import argparse
+import collections
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from advisor import LivestockHealthAdvisor
+from catalog import load_catalog, open_catalog
+from diseases import disease_database, symptoms
+from records import RECORD_FORMATS, decode_lines, read_records
+
+# The advisor of the current process, created once per worker by init_worker
+advisor = None
+
+
+# catalog_path names a prebuilt JSON or SQLite catalog; None uses diseases.py
+def init_worker(cache_size, catalog_path=None):
+    global advisor
+    catalog = open_catalog(catalog_path) if catalog_path else load_catalog(disease_database, symptoms)
+    advisor = LivestockHealthAdvisor(catalog, cache_size=cache_size)
+
+
+# Diagnose a list of (line_number, record, error) and return the output text for it
+def diagnose_chunk(chunk, limit):
+    return ''.join(
+        json.dumps(answer, separators=(',', ':')) + '\n' for answer in advisor.diagnose_records(chunk, limit)
+    )
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Record format from the file extension when not given explicitly
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def run(input_path, output_path, record_format, default_animal_type, limit, workers, chunk_size, cache_size,
+        catalog_path=None):
+    with open(input_path, 'rb') as source, open(output_path, 'w', encoding='utf-8') as output:
+        chunks = chunked(read_records(decode_lines(source), record_format, default_animal_type), chunk_size)
+
+        if workers == 1:
+            init_worker(cache_size, catalog_path)
+            for chunk in chunks:
+                output.write(diagnose_chunk(chunk, limit))
+            return
+
+        # Keep a bounded number of chunks in flight so memory stays flat however large
+        # the input is, and write results back in submission (= input) order
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(cache_size, catalog_path)) as executor:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(executor.submit(diagnose_chunk, chunk, limit))
+                if len(pending) >= workers * 2:
+                    output.write(pending.popleft().result())
+            while pending:
+                output.write(pending.popleft().result())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Diagnose a file of animal symptom records.')
+    parser.add_argument('input', help='CSV or NDJSON file, one animal per line')
+    parser.add_argument('output', help='NDJSON file to write the diagnoses to')
+    parser.add_argument('--format', choices=RECORD_FORMATS, help='input format (default: from the file extension)')
+    parser.add_argument('--animal-type', default='cattle', help='species for records that do not name one')
+    parser.add_argument('--limit', type=int, default=3, help='results kept per animal')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='records per work unit')
+    parser.add_argument('--cache-size', type=int, default=4096, help='result cache entries per worker')
+    parser.add_argument('--catalog', help='prebuilt JSON or SQLite catalog (default: diseases.py)')
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.chunk_size < 1 or args.limit < 1:
+        sys.exit('--workers, --chunk-size and --limit must be at least 1')
+    run(args.input, args.output, args.format or guess_format(args.input), args.animal_type,
+        args.limit, args.workers, args.chunk_size, args.cache_size, args.catalog)
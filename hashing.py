@@ -0,0 +1,54 @@
+# Password hashing off the request threads.
+#
+# generate_password_hash and check_password_hash are slow on purpose (and scrypt
+# needs tens of megabytes per hash). A PasswordHasher runs them on a small pool of
+# its own threads, so a burst of logins keeps at most `workers` cores busy and
+# leaves the rest to /search. hashlib releases the GIL while it hashes, so the
+# pool threads do not hold up the request threads either. Hashes beyond the pool
+# wait in a bounded queue; when that is full, or a hash takes longer than the
+# timeout, HashingBusy is raised and the request can be turned away.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    # method: werkzeug hash method and cost for new hashes, e.g. 'scrypt:32768:8:1' or
+    # 'pbkdf2:sha256:600000'; existing hashes are checked with the cost they were made with.
+    # max_queued: hashes waiting for a worker before new ones are refused.
+    # timeout: seconds a request waits for its hash.
+    def __init__(self, method='scrypt:32768:8:1', workers=2, max_queued=16, timeout=10.0):
+        self.method = method
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='password-hash')
+        # One slot per running or queued hash, given back when the hash finishes
+        self.slots = threading.BoundedSemaphore(workers + max_queued)
+
+    # func(*args) on the pool, or HashingBusy
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy('too many password hashes in progress')
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # Dropped from the queue if it has not started; a running hash keeps its slot until done
+            future.cancel()
+            raise HashingBusy(f'password hash took longer than {self.timeout}s') from None
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
@@ -1,4 +1,5 @@
 from flask import Flask, render_template, request
+from diseases import disease_database, symptoms
 
 app = Flask(__name__)
 @app.route('/')
@@ -10,155 +11,6 @@ if __name__ == '__main__':
 
 
 
-# Database of diseases and remedies
-disease_database = {
-    'cattle': [
-        {
-            'id': 1,
-            'name': "Bovine Respiratory Disease (BRD)",
-            'symptoms': ["coughing", "nasal discharge", "fever", "reduced appetite", "labored breathing"],
-            'description': "A complex of diseases affecting the lungs and respiratory tract of cattle.",
-            'severity': "High",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Antibiotics like florfenicol, tulathromycin, or tilmicosin as prescribed by a veterinarian."
-                },
-                {
-                    'type': "Management",
-                    'details': "Provide good ventilation, reduce stress, isolate affected animals."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Vaccination against viral pathogens, proper nutrition, and stress management."
-                }
-            ]
-        },
-        {
-            'id': 2,
-            'name': "Foot and Mouth Disease",
-            'symptoms': ["fever", "blisters on mouth", "blisters on feet", "excessive salivation", "lameness"],
-            'description': "A highly contagious viral disease affecting cloven-hoofed animals.",
-            'severity': "Critical - Reportable Disease",
-            'treatments': [
-                {
-                    'type': "Action Required",
-                    'details': "Contact veterinary authorities immediately. This is a notifiable disease."
-                },
-                {
-                    'type': "Management",
-                    'details': "Quarantine affected animals, implement biosecurity measures."
-                },
-                {
-                    'type': "Treatment",
-                    'details': "Supportive care only. Treatment focuses on pain management and preventing secondary infections."
-                }
-            ]
-        },
-        {
-            'id': 3,
-            'name': "Mastitis",
-            'symptoms': ["swollen udder", "abnormal milk", "pain in udder", "reduced milk production", "fever"],
-            'description': "Inflammation of the mammary gland usually caused by bacterial infection.",
-            'severity': "Moderate to High",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Intramammary antibiotics, systemic antibiotics for severe cases as prescribed by vet."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Frequent milking, cold or warm compresses, anti-inflammatory drugs."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Good milking hygiene, proper housing, teat dipping after milking."
-                }
-            ]
-        }
-    ],
-    'goat': [
-        {
-            'id': 1,
-            'name': "Caprine Arthritis Encephalitis (CAE)",
-            'symptoms': ["joint swelling", "lameness", "weight loss", "pneumonia", "neurological symptoms"],
-            'description': "A viral disease affecting goats that causes chronic progressive arthritis and encephalitis.",
-            'severity': "High - No Cure",
-            'treatments': [
-                {
-                    'type': "Management",
-                    'details': "No specific treatment. Manage pain with anti-inflammatory drugs prescribed by a vet."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Testing and culling, separating kids from infected dams at birth."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Provide comfortable bedding, easy access to food and water."
-                }
-            ]
-        },
-        {
-            'id': 2,
-            'name': "Enterotoxemia (Overeating Disease)",
-            'symptoms': ["sudden death", "abdominal pain", "diarrhea", "convulsions", "bloating"],
-            'description': "Caused by Clostridium perfringens bacteria that produce toxins in the intestine.",
-            'severity': "Critical",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Antitoxin, antibiotics, anti-inflammatories as prescribed by vet."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Oral electrolytes, IV fluids, reduce feed intake temporarily."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Vaccination, gradual diet changes, avoid overfeeding grain."
-                }
-            ]
-        },
-        {
-            'id': 3,
-            'name': "Coccidiosis",
-            'symptoms': ["diarrhea", "weight loss", "dehydration", "weakness", "bloody stool"],
-            'description': "A parasitic disease caused by protozoa affecting the intestinal tract.",
-            'severity': "Moderate",
-            'treatments': [
-                {
-                    'type': "Medication",
-                    'details': "Sulfa drugs, amprolium, or other coccidiostats as prescribed by a vet."
-                },
-                {
-                    'type': "Supportive Care",
-                    'details': "Fluids to prevent dehydration, electrolytes, good nutrition."
-                },
-                {
-                    'type': "Prevention",
-                    'details': "Clean housing, prevent overcrowding, good sanitation, coccidiostats in feed for prevention."
-                }
-            ]
-        }
-    ]
-}
-
-# Common symptoms for each animal type
-symptoms = {
-    'cattle': [
-        "coughing", "nasal discharge", "fever", "reduced appetite", "labored breathing", 
-        "swollen udder", "abnormal milk", "pain in udder", "reduced milk production",
-        "blisters on mouth", "blisters on feet", "excessive salivation", "lameness",
-        "diarrhea", "weight loss", "dehydration", "weakness", "bloody stool"
-    ],
-    'goat': [
-        "joint swelling", "lameness", "weight loss", "pneumonia", "neurological symptoms",
-        "sudden death", "abdominal pain", "diarrhea", "convulsions", "bloating",
-        "dehydration", "weakness", "bloody stool", "fever", "coughing", "reduced appetite"
-    ]
-}
-
 # Rule-based disease diagnostic system
 class LivestockHealthAdvisor:
     def __init__(self):
@@ -0,0 +1,120 @@
+# Vectorized herd screening.
+#
+# For each species the catalog is turned into a disease x symptom incidence
+# matrix. A herd of animals becomes an animal x symptom observation matrix,
+# and one matrix multiply gives every animal's match count for every disease.
+# Ranking, coverage, urgency and severity follow the same rules as
+# LivestockHealthAdvisor.search_diseases with no search text.
+
+import numpy as np
+
+from catalog import DiseaseResult
+
+
+# Incidence matrix and per-disease rule outputs for one species
+class SpeciesMatrix:
+    def __init__(self, diseases, selectable_symptoms):
+        self.diseases = diseases
+        # Column per symptom, in first-seen order over the form symptoms and then the diseases
+        self.columns = {}
+        for symptom in selectable_symptoms:
+            self.columns.setdefault(symptom, len(self.columns))
+        for disease in diseases:
+            for symptom in disease.symptoms:
+                self.columns.setdefault(symptom, len(self.columns))
+
+        self.incidence = np.zeros((len(diseases), len(self.columns)), dtype=np.float32)
+        for row, disease in enumerate(diseases):
+            self.incidence[row, [self.columns[symptom] for symptom in disease.symptoms]] = 1
+        self.urgent = np.array([disease.urgent for disease in diseases], dtype=bool)
+        self.severity_scores = np.array([disease.severity_score for disease in diseases], dtype=np.int8)
+
+
+# Match counts, coverage and ranking for every animal of a screened herd
+class HerdScreening:
+    def __init__(self, species, herd_symptoms, match_counts, selected_counts):
+        self.species = species
+        self.herd_symptoms = herd_symptoms
+        self.match_counts = match_counts
+        # Rule 5: share of each animal's selected symptoms matched by each disease
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coverage = match_counts / selected_counts[:, None] * 100
+        self.coverage = np.where(selected_counts[:, None] > 0, coverage, 0.0)
+        # Rule 2: highest match count first, catalog order among ties
+        self.ranking = np.argsort(-match_counts, axis=1, kind='stable')
+        # Rule 1: diseases matching at least one symptom, or all of them when none were given
+        self.candidate_counts = np.where(
+            selected_counts > 0,
+            np.count_nonzero(match_counts, axis=1),
+            len(species.diseases)
+        )
+        self.urgent = species.urgent[self.ranking]
+        self.severity_scores = species.severity_scores[self.ranking]
+
+    def __len__(self):
+        return len(self.herd_symptoms)
+
+    # Ranked DiseaseResult list for one animal, as search_diseases would return it
+    # (only the first `limit` when given)
+    def results(self, animal, limit=None):
+        selected_symptoms = self.herd_symptoms[animal]
+        if not selected_symptoms:
+            return [
+                DiseaseResult(disease, urgent=disease.urgent, severity_score=disease.severity_score)
+                for disease in self.species.diseases[:limit]
+            ]
+
+        count = self.candidate_counts[animal] if limit is None else min(self.candidate_counts[animal], limit)
+        results = []
+        for row in self.ranking[animal, :count].tolist():
+            disease = self.species.diseases[row]
+            results.append(DiseaseResult(
+                disease,
+                urgent=disease.urgent,
+                matching_symptoms=[s for s in selected_symptoms if s in disease.symptom_set],
+                symptom_coverage=float(self.coverage[animal, row]),
+                severity_score=disease.severity_score
+            ))
+        return results
+
+    # Whether any of the animal's candidate diseases is urgent (Rule 4)
+    def any_urgent(self, animal):
+        return bool(self.urgent[animal, :self.candidate_counts[animal]].any())
+
+    def __iter__(self):
+        for animal in range(len(self)):
+            yield self.results(animal)
+
+
+class HerdScreener:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        # animal type -> SpeciesMatrix, built the first time a species is screened
+        self.species = {}
+
+    # Score a herd: herd_symptoms holds one list of observed symptoms per animal
+    def screen(self, animal_type, herd_symptoms):
+        species = self.species.get(animal_type)
+        if species is None:
+            species_catalog = self.catalog.species(animal_type)
+            species = SpeciesMatrix(species_catalog.diseases, species_catalog.symptoms)
+            self.species[animal_type] = species
+        # Repeated symptoms count once, as in the cached single-animal search
+        herd_symptoms = [list(dict.fromkeys(symptoms)) for symptoms in herd_symptoms]
+
+        # Collect the (animal, symptom column) cells first and set them in one scatter
+        rows = []
+        columns = []
+        for animal, symptoms in enumerate(herd_symptoms):
+            for symptom in symptoms:
+                column = species.columns.get(symptom)
+                if column is not None:
+                    rows.append(animal)
+                    columns.append(column)
+        observations = np.zeros((len(herd_symptoms), len(species.columns)), dtype=np.float32)
+        observations[rows, columns] = 1
+        # Symptoms unknown to the species still count towards coverage, as in Rule 5
+        selected_counts = np.fromiter(map(len, herd_symptoms), dtype=np.float64, count=len(herd_symptoms))
+
+        match_counts = np.rint(observations @ species.incidence.T).astype(np.int32)
+        return HerdScreening(species, herd_symptoms, match_counts, selected_counts)
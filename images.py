@@ -0,0 +1,133 @@
+# Resized, recompressed JPEG and WebP derivatives of the static images.
+#
+# Derivatives are written to static/derived/ by `python images.py`, or built on
+# the first request for one that is missing. Pillow is optional: without it no
+# derivatives are produced and pages fall back to the original images.
+
+import functools
+import os
+import re
+import sys
+import tempfile
+from urllib.parse import quote
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Widths generated for every image: 1x/2x/4x of the 80px animal avatars and
+# 1x/2x of the 150px disease pictures
+DERIVED_WIDTHS = (80, 160, 320)
+
+# Derivative extension -> (Pillow format, save options)
+DERIVED_FORMATS = {
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 75, 'method': 6}),
+}
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DERIVED_DIR = os.path.join(SOURCE_DIR, 'derived')
+DERIVED_URL = '/static/derived/'
+
+DERIVED_NAME = re.compile(r'^(?P<stem>.+)-(?P<width>\d+)w\.(?P<ext>jpg|webp)$')
+
+
+def derived_name(filename, width, ext):
+    return f'{os.path.splitext(filename)[0]}-{width}w.{ext}'
+
+
+# Pixel widths actually produced for a source image (never upscaled)
+@functools.cache
+def derived_widths(filename):
+    if Image is None:
+        return ()
+    try:
+        with Image.open(os.path.join(SOURCE_DIR, filename)) as image:
+            source_width = image.width
+    except OSError:
+        return ()
+    return tuple(sorted({min(width, source_width) for width in DERIVED_WIDTHS}))
+
+
+# URL of one derivative; version (the source's content hash) makes it cacheable forever
+def derived_url(filename, width, ext, version=None):
+    url = DERIVED_URL + quote(derived_name(filename, width, ext))
+    return f'{url}?v={version}' if version else url
+
+
+# srcset attribute value listing every derivative of filename in one format
+def srcset(filename, ext, version=None):
+    return ', '.join(
+        f'{derived_url(filename, width, ext, version)} {width}w'
+        for width in derived_widths(filename)
+    )
+
+
+def build_derivative(filename, width, ext):
+    source_path = os.path.join(SOURCE_DIR, filename)
+    path = os.path.join(DERIVED_DIR, derived_name(filename, width, ext))
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path):
+        return path
+
+    image_format, save_options = DERIVED_FORMATS[ext]
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+    with Image.open(source_path) as image:
+        image = image.convert('RGB')
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        # Write to a temporary file of its own next to the target and rename, so concurrent
+        # builds (threads or processes) never share a file and readers never see a partial one
+        fd, tmp_path = tempfile.mkstemp(dir=DERIVED_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                image.save(tmp_file, format=image_format, **save_options)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return path
+
+
+# (source filename, width, ext) of the derivative named filename, or None for
+# names that don't correspond to a source image and one of its widths
+def derivative_source(filename):
+    match = DERIVED_NAME.match(filename)
+    if match is None or Image is None:
+        return None
+    width = int(match.group('width'))
+    for extension in SOURCE_EXTENSIONS:
+        source = match.group('stem') + extension
+        if (os.path.basename(source) == source and os.path.isfile(os.path.join(SOURCE_DIR, source))
+                and width in derived_widths(source)):
+            return source, width, match.group('ext')
+    return None
+
+
+# Path of the derivative named filename, building it on first use, or None
+def ensure_derivative(filename):
+    source = derivative_source(filename)
+    if source is None:
+        return None
+    return build_derivative(*source)
+
+
+def source_images():
+    return sorted(
+        filename for filename in os.listdir(SOURCE_DIR)
+        if os.path.splitext(filename)[1].lower() in SOURCE_EXTENSIONS
+    )
+
+
+# Build every derivative of every static image: python images.py
+if __name__ == '__main__':
+    if Image is None:
+        sys.exit('Pillow is required to build image derivatives (pip install Pillow)')
+    for filename in source_images():
+        for width in derived_widths(filename):
+            for ext in DERIVED_FORMATS:
+                path = build_derivative(filename, width, ext)
+                print(f'{os.path.relpath(path, SOURCE_DIR)}: {os.path.getsize(path)} bytes')
@@ -0,0 +1,72 @@
+# Session signing keys shared by every worker process.
+#
+# Flask signs the session cookie with SECRET_KEY, so every process serving the
+# app, on every host, must use the same key or a cookie set by one is rejected
+# by the next. The keys live in a key file, one per line: the first signs new
+# cookies and the ones below it are older keys that are still accepted
+# (SECRET_KEY_FALLBACKS), so rotating does not log everybody out.
+#
+# A missing key file is created with a random key by whichever worker starts
+# first; the others read it. Copy the file to each host (or set SECRET_KEY in
+# the environment) when running on several.
+#
+# Usage: python keys.py rotate PATH [--keep 1]
+#   puts a new key first and keeps `keep` of the previous ones; restart the
+#   workers to pick it up.
+
+import argparse
+import os
+import secrets
+
+
+def new_key():
+    return secrets.token_hex(32)
+
+
+def read_keys(path):
+    with open(path, encoding='utf-8') as key_file:
+        return [line.strip() for line in key_file if line.strip() and not line.startswith('#')]
+
+
+# Key file contents written to a private temporary file next to path
+def write_tmp(path, keys):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as key_file:
+        key_file.write(''.join(key + '\n' for key in keys))
+    return tmp_path
+
+
+# (key, fallback keys) from the key file, creating it when missing
+def load_secret_keys(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(path):
+        # link() fails if the file exists, so of several workers starting together exactly
+        # one creates it, and nobody ever sees it half written
+        tmp_path = write_tmp(path, [new_key()])
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    keys = read_keys(path)
+    if not keys:
+        raise ValueError(f'{path} holds no keys')
+    return keys[0], keys[1:]
+
+
+# Put a new key first, keeping `keep` of the previous ones as fallbacks
+def rotate(path, keep=1):
+    keys = read_keys(path) if os.path.exists(path) else []
+    os.replace(write_tmp(path, [new_key()] + keys[:keep]), path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the session signing key file.')
+    parser.add_argument('command', choices=('rotate',))
+    parser.add_argument('path', help='key file, for example instance/secret_key')
+    parser.add_argument('--keep', type=int, default=1, help='previous keys still accepted after rotating')
+    args = parser.parse_args()
+    rotate(args.path, args.keep)
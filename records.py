@@ -0,0 +1,104 @@
+# Readers for per-animal symptom records, one animal per line.
+#
+# NDJSON: {"animal_id": "A17", "animal_type": "goat", "symptoms": ["diarrhea", "weight loss"]}
+# CSV:    animal_id,animal_type,symptoms
+#         A17,goat,diarrhea;weight loss
+#
+# animal_type may be left out, in which case the caller's default is used.
+# Readers are generators over an iterable of text lines, so records are
+# parsed as they arrive and memory use does not grow with the input.
+
+import csv
+import json
+
+# Separator between symptoms inside one CSV cell
+SYMPTOM_SEPARATOR = ';'
+
+# Longest line read from a byte stream, newline included
+MAX_LINE_BYTES = 64 * 1024
+
+RECORD_FORMATS = ('ndjson', 'csv')
+
+
+# Yielded by decode_lines in place of a longer line, which is skipped; the readers
+# report it as an error for its line. A str so the csv module can still read it.
+class LongLine(str):
+    pass
+
+
+LINE_TOO_LONG = LongLine('\n')
+
+
+# Text lines of a binary stream (a request body or an open file), read one at a time
+def decode_lines(stream, encoding='utf-8'):
+    for line in iter(lambda: stream.readline(MAX_LINE_BYTES), b''):
+        if len(line) == MAX_LINE_BYTES and not line.endswith(b'\n'):
+            rest = stream.readline(MAX_LINE_BYTES)
+            if rest:
+                # Discard the rest of the line rather than read it as further lines
+                while rest and not rest.endswith(b'\n'):
+                    rest = stream.readline(MAX_LINE_BYTES)
+                yield LINE_TOO_LONG
+                continue
+        yield line.decode(encoding, errors='replace')
+
+
+def make_record(animal_id, animal_type, symptoms):
+    return {'animal_id': animal_id, 'animal_type': animal_type, 'symptoms': symptoms}
+
+
+# Yields (line_number, record, error); exactly one of record and error is None
+def read_ndjson(lines, default_animal_type):
+    for line_number, line in enumerate(lines, 1):
+        if line is LINE_TOO_LONG:
+            yield line_number, None, 'line too long'
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'invalid JSON'
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, 'record must be a JSON object'
+            continue
+        symptoms = data.get('symptoms', [])
+        if not isinstance(symptoms, list) or not all(isinstance(s, str) for s in symptoms):
+            yield line_number, None, 'symptoms must be a list of strings'
+            continue
+        yield line_number, make_record(data.get('animal_id'), data.get('animal_type') or default_animal_type, symptoms), None
+
+
+# Yields (line_number, record, error); the first line is the header
+def read_csv(lines, default_animal_type):
+    # Numbers of the lines too long to read, noted as the csv reader takes them
+    long_lines = []
+
+    def note_long_lines(lines):
+        for line_number, line in enumerate(lines, 1):
+            if line is LINE_TOO_LONG:
+                long_lines.append(line_number)
+            yield line
+
+    reader = csv.DictReader(note_long_lines(lines))
+    if reader.fieldnames is None or 'symptoms' not in reader.fieldnames:
+        yield 1, None, 'line too long' if long_lines else 'CSV header must include a symptoms column'
+        return
+    for row in reader:
+        # A long line reads as a blank one, which the csv reader skips
+        for line_number in long_lines:
+            yield line_number, None, 'line too long'
+        long_lines.clear()
+        symptoms = [s.strip() for s in (row.get('symptoms') or '').split(SYMPTOM_SEPARATOR) if s.strip()]
+        yield reader.line_num, make_record(row.get('animal_id'), row.get('animal_type') or default_animal_type, symptoms), None
+    for line_number in long_lines:
+        yield line_number, None, 'line too long'
+
+
+def read_records(lines, record_format, default_animal_type='cattle'):
+    if record_format == 'csv':
+        return read_csv(lines, default_animal_type)
+    if record_format == 'ndjson':
+        return read_ndjson(lines, default_animal_type)
+    raise ValueError(f'Unknown record format {record_format!r}, expected one of {RECORD_FORMATS}')
@@ -0,0 +1,114 @@
+# Hot reload of the disease catalog.
+#
+# A CatalogReloader builds a fresh catalog off the request path (in its watcher
+# thread, or in the admin request that asked for it), builds the species the
+# running catalog has in use, and only then swaps it into the advisor. Searches
+# already running finish on the catalog they started with, and a catalog that
+# fails to build never replaces the one in service. A process forked after
+# start() (gunicorn --preload) starts a watcher of its own.
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogReloader:
+    # load: callable returning a new Catalog. paths: files whose changes trigger a reload.
+    # on_swap: callables run as callback(previous, catalog) after each swap, for example
+    # to drop caches keyed on the previous catalog version.
+    def __init__(self, advisor, load, paths, interval=5.0, on_swap=()):
+        self.advisor = advisor
+        self.load = load
+        self.paths = tuple(paths)
+        self.interval = interval
+        self.on_swap = list(on_swap)
+        self.lock = threading.Lock()
+        self.signatures = self.file_signatures()
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.loaded_at = time.time()
+        self.thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.after_fork)
+
+    # (mtime, size) of every watched file, None for a missing one
+    def file_signatures(self):
+        signatures = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signatures.append(None)
+            else:
+                signatures.append((stat.st_mtime_ns, stat.st_size))
+        return signatures
+
+    # Build a new catalog and swap it in; returns (previous_version, version), equal when
+    # nothing changed. Build errors are recorded and re-raised, and the current catalog stays.
+    def reload(self):
+        with self.lock:
+            # Taken before loading, so a change made during the build triggers another reload
+            self.signatures = self.file_signatures()
+            current = self.advisor.catalog
+            try:
+                catalog = self.load()
+                for animal_type in list(current.loaded_species):
+                    if animal_type in catalog.species_names:
+                        catalog.species(animal_type)
+            except Exception as error:
+                self.failures += 1
+                self.last_error = f'{type(error).__name__}: {error}'
+                raise
+            self.last_error = None
+
+            if catalog.version == current.version:
+                return current.version, catalog.version
+            self.advisor.swap_catalog(catalog)
+            for callback in self.on_swap:
+                callback(current, catalog)
+            self.reloads += 1
+            self.loaded_at = time.time()
+            logger.info('Catalog reloaded: version %s -> %s', current.version, catalog.version)
+            return current.version, catalog.version
+
+    # Reload when a watched file changed since the last reload
+    def check(self):
+        if self.file_signatures() != self.signatures:
+            self.reload()
+
+    def watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Catalog reload failed; still serving version %s', self.advisor.catalog.version)
+
+    # Poll the watched files every interval seconds in a daemon thread
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.watch, name='catalog-reloader', daemon=True)
+            self.thread.start()
+        return self
+
+    def after_fork(self):
+        started = self.thread is not None
+        # A reload may have held the lock when the parent forked
+        self.lock = threading.Lock()
+        self.thread = None
+        if started:
+            self.start()
+
+    def stats(self):
+        return {
+            'version': self.advisor.catalog.version,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'watching': self.thread is not None and self.thread.is_alive()
+        }
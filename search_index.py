@@ -0,0 +1,226 @@
+# Full-text index used by Rule 3 (search text in name, description, or symptoms).
+#
+# Every indexed text contributes its character 1-, 2- and 3-grams and its
+# whitespace-separated words. Postings are bitsets over record positions, so
+# a query resolves to candidates by AND-ing a few ints instead of scanning
+# every record. Queries longer than three characters are then verified with
+# the same substring test Rule 3 always used, so results do not change.
+
+import re
+
+GRAM_SIZE = 3
+
+
+# Substrings of text up to GRAM_SIZE characters long
+def text_grams(text):
+    grams = set()
+    for size in range(1, GRAM_SIZE + 1):
+        for start in range(len(text) - size + 1):
+            grams.add(text[start:start + size])
+    return grams
+
+
+# Words of the query that are whitespace-bounded on both sides, so they must
+# also appear as whole words in any text containing the query
+def complete_words(query):
+    words = query.split()
+    complete = []
+    for i, word in enumerate(words):
+        bounded_left = i > 0 or query[:1].isspace()
+        bounded_right = i < len(words) - 1 or query[-1:].isspace()
+        if bounded_left and bounded_right:
+            complete.append(word)
+    return complete
+
+
+class TextIndex:
+    # documents: iterable of (record, texts) pairs
+    def __init__(self, documents):
+        self.records = []
+        self.texts = []
+        self.grams = {}
+        self.words = {}
+        for position, (record, texts) in enumerate(documents):
+            bit = 1 << position
+            self.records.append(record)
+            self.texts.append(tuple(texts))
+            for text in texts:
+                for gram in text_grams(text):
+                    self.grams[gram] = self.grams.get(gram, 0) | bit
+                for word in text.split():
+                    self.words[word] = self.words.get(word, 0) | bit
+
+    # Bitset of record positions whose texts contain query as a substring
+    def search_mask(self, query):
+        if not query:
+            return (1 << len(self.records)) - 1
+
+        # Short queries are grams themselves, so their postings are exact
+        if len(query) <= GRAM_SIZE:
+            return self.grams.get(query, 0)
+
+        candidates = -1
+        for word in complete_words(query):
+            candidates &= self.words.get(word, 0)
+            if not candidates:
+                return 0
+        for start in range(len(query) - GRAM_SIZE + 1):
+            candidates &= self.grams.get(query[start:start + GRAM_SIZE], 0)
+            if not candidates:
+                return 0
+
+        # Gram postings over-approximate; confirm the substring on the survivors
+        matches = 0
+        while candidates:
+            lowest_bit = candidates & -candidates
+            position = lowest_bit.bit_length() - 1
+            if any(query in text for text in self.texts[position]):
+                matches |= lowest_bit
+            candidates ^= lowest_bit
+        return matches
+
+    # Records whose texts contain query as a substring
+    def search(self, query):
+        mask = self.search_mask(query)
+        matches = set()
+        while mask:
+            lowest_bit = mask & -mask
+            matches.add(self.records[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return matches
+
+
+# Bit masks of where each character occurs in word, for pattern_distance
+def word_pattern(word):
+    positions = {}
+    for i, char in enumerate(word):
+        positions[char] = positions.get(char, 0) | (1 << i)
+    return positions, len(word)
+
+
+# Levenshtein distance between a precomputed word_pattern and text, using
+# Myers' bit-parallel algorithm: one column of the DP table per character
+# of text, held as +1/-1 delta bitsets instead of a Python list
+def pattern_distance(pattern, text):
+    positions, length = pattern
+    if not length:
+        return len(text)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    plus, minus, distance = full, 0, length
+    for char in text:
+        equal = positions.get(char, 0)
+        vertical = equal | minus
+        horizontal = (((equal & plus) + plus) ^ plus) | equal
+        horizontal_plus = minus | (~(horizontal | plus) & full)
+        horizontal_minus = plus & horizontal
+        if horizontal_plus & last:
+            distance += 1
+        elif horizontal_minus & last:
+            distance -= 1
+        horizontal_plus = ((horizontal_plus << 1) | 1) & full
+        horizontal_minus = (horizontal_minus << 1) & full
+        plus = horizontal_minus | (~(vertical | horizontal_plus) & full)
+        minus = horizontal_plus & vertical
+    return distance
+
+
+# Levenshtein distance between two words
+def edit_distance(a, b):
+    return pattern_distance(word_pattern(a), b)
+
+
+# BK-tree over a word vocabulary for edit-distance lookups. Each node is
+# [word, {distance: child node}]; the triangle inequality lets a search skip
+# every subtree whose edge distance is outside distance +/- max_distance.
+class BKTree:
+    def __init__(self, words=()):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = [word, {}]
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                return
+            node = child
+
+    # (distance, word) pairs within max_distance, closest first
+    def search(self, word, max_distance):
+        matches = []
+        pattern = word_pattern(word)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = pattern_distance(pattern, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[0]))
+            for edge, child in node[1].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        matches.sort()
+        return matches
+
+
+# Lowercase alphanumeric words of a text
+def tokenize(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+# Typos allowed in a query word: none for short words, more for longer ones
+def allowed_typos(word):
+    if len(word) <= 3:
+        return 0
+    if len(word) <= 6:
+        return 1
+    return 2
+
+
+# Typo-tolerant lookup: every query word is matched to vocabulary words within
+# its allowed edit distance, and records must match all query words.
+class FuzzyIndex:
+    # documents: iterable of (record, texts) pairs
+    def __init__(self, documents):
+        self.word_records = {}
+        for record, texts in documents:
+            for text in texts:
+                for word in tokenize(text):
+                    # Lists keep records in document order so equal distances rank stably
+                    records = self.word_records.setdefault(word, [])
+                    if not records or records[-1] is not record:
+                        records.append(record)
+        self.tree = BKTree(self.word_records)
+
+    # (total edit distance, record) pairs, closest first
+    def search(self, query):
+        distances = None
+        for word in tokenize(query):
+            word_distances = {}
+            for distance, match in self.tree.search(word, allowed_typos(word)):
+                for record in self.word_records[match]:
+                    if distance < word_distances.get(record, distance + 1):
+                        word_distances[record] = distance
+            if distances is None:
+                distances = word_distances
+            else:
+                distances = {
+                    record: distance + word_distances[record]
+                    for record, distance in distances.items()
+                    if record in word_distances
+                }
+            if not distances:
+                return []
+        if not distances:
+            return []
+        ranked = [(distance, position, record) for position, (record, distance) in enumerate(distances.items())]
+        ranked.sort()
+        return [(distance, record) for distance, position, record in ranked]
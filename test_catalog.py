@@ -0,0 +1,48 @@
+# A SQLite catalog keeps serving the file it opened after a rebuild renames a
+# new one into place, so species loaded late still use matching symptom ids.
+#
+# Run with: python -m pytest test_catalog.py
+
+import copy
+
+import pytest
+
+from catalog import Catalog, compile_catalog, open_catalog, write_catalog
+from diseases import disease_database, symptoms
+
+
+def species(catalog, animal_type):
+    species = catalog.species(animal_type)
+    return [(disease.name, disease.symptoms) for disease in species.diseases], species.symptoms
+
+
+# The source with one new cattle symptom, which shifts the ids of every later symptom
+def rebuilt_source():
+    rebuilt = copy.deepcopy(disease_database)
+    rebuilt['cattle'][0]['symptoms'].append('tail biting')
+    return rebuilt
+
+
+def test_replaced_file_does_not_change_an_open_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.db')
+    write_catalog(compile_catalog(disease_database, symptoms), path)
+    catalog = open_catalog(path)
+    catalog.species('cattle')
+
+    write_catalog(compile_catalog(rebuilt_source(), symptoms), path)
+    assert species(catalog, 'goat') == species(Catalog.from_source(disease_database, symptoms), 'goat')
+
+
+def test_forked_process_refuses_a_replaced_file(tmp_path):
+    path = str(tmp_path / 'catalog.db')
+    write_catalog(compile_catalog(disease_database, symptoms), path)
+    catalog = open_catalog(path)
+    write_catalog(compile_catalog(rebuilt_source(), symptoms), path)
+
+    # As if the catalog had been opened by the parent of a forked worker
+    catalog.backend.pid = None
+    with pytest.raises(ValueError, match='now holds catalog version'):
+        catalog.species('goat')
+    # and keeps refusing, rather than reading the new file on the next try
+    with pytest.raises(ValueError):
+        catalog.species('goat')
@@ -0,0 +1,190 @@
+# The fast paths must give the same answers as the straightforward ones they
+# replace: the fused engine (with and without the result cache, paged or not)
+# as the rule chain, TextIndex as a substring scan, and herd screening as one
+# search per animal.
+#
+# Run with: python -m pytest test_engines.py
+
+import random
+
+import pytest
+
+from advisor import RANKINGS, LivestockHealthAdvisor
+from benchmark import synthetic_source
+from catalog import Catalog
+from diseases import disease_database, symptoms
+from search_index import TextIndex
+
+QUERIES = 400
+
+
+def catalogs():
+    yield 'diseases.py', Catalog.from_source(disease_database, symptoms)
+    yield 'synthetic', Catalog.from_source(*synthetic_source(600, n_species=3, symptoms_per_species=60))
+
+
+@pytest.fixture(scope='module', params=list(catalogs()), ids=lambda named: named[0])
+def catalog(request):
+    return request.param[1]
+
+
+# Symptom lists drawn from the species' diseases, with repeats and shuffled order
+def random_symptoms(rng, species):
+    pool = sorted({symptom for disease in species.diseases for symptom in disease.symptoms})
+    selected = rng.sample(pool, rng.randint(0, min(4, len(pool))))
+    if selected and rng.random() < 0.3:
+        selected.append(rng.choice(selected))
+    rng.shuffle(selected)
+    return selected
+
+
+# Search text: empty, a fragment of a disease name or symptom, or a word with a typo
+def random_text(rng, species):
+    choice = rng.random()
+    if choice < 0.5:
+        return ''
+    disease = rng.choice(species.diseases)
+    text = rng.choice((disease.name,) + disease.symptoms).lower()
+    if choice < 0.8:
+        start = rng.randrange(len(text))
+        return text[start:start + rng.randint(1, 8)]
+    word = max(text.split(), key=len)
+    return word[:-1] + ('x' if word[-1] != 'x' else 'y')
+
+
+def random_queries(catalog, seed=0):
+    rng = random.Random(seed)
+    for _ in range(QUERIES):
+        animal_type = rng.choice(sorted(catalog.species_names))
+        species = catalog.species(animal_type)
+        yield animal_type, random_symptoms(rng, species), random_text(rng, species), rng.choice(RANKINGS)
+
+
+def as_dicts(results):
+    return [result.to_dict() for result in results]
+
+
+def test_fused_matches_chain(catalog):
+    chain = LivestockHealthAdvisor(catalog, engine='chain', cache_size=0)
+    fused = LivestockHealthAdvisor(catalog, engine='fused', cache_size=0)
+    cached = LivestockHealthAdvisor(catalog, engine='fused')
+    for animal_type, selected, text, ranking in random_queries(catalog):
+        expected = as_dicts(chain.search_diseases(animal_type, selected, text, ranking))
+        assert as_dicts(fused.search_diseases(animal_type, selected, text, ranking)) == expected
+        # Twice, so the second answer comes from the cache
+        for _ in range(2):
+            assert as_dicts(cached.search_diseases(animal_type, selected, text, ranking)) == expected
+
+
+def test_pages_match_chain(catalog):
+    chain = LivestockHealthAdvisor(catalog, engine='chain', cache_size=0)
+    rng = random.Random(1)
+    for cache_size in (0, 1024):
+        fused = LivestockHealthAdvisor(catalog, engine='fused', cache_size=cache_size)
+        for animal_type, selected, text, ranking in random_queries(catalog, seed=2):
+            expected = as_dicts(chain.search_diseases(animal_type, selected, text, ranking))
+            limit = rng.randint(1, 25)
+            offset = rng.randint(0, len(expected) + 5)
+            results, total = fused.search_page(animal_type, selected, text, ranking, limit, offset)
+            assert total == len(expected)
+            assert as_dicts(results) == expected[offset:offset + limit]
+
+
+def test_search_many_matches_search_diseases(catalog):
+    advisor = LivestockHealthAdvisor(catalog, cache_size=0)
+    queries = [(animal_type, selected, text, ranking) for animal_type, selected, text, ranking in random_queries(catalog, seed=3)]
+    # The same queries again with the symptoms reversed, answered from the batch's own memo
+    queries += [(animal_type, selected[::-1], text, ranking) for animal_type, selected, text, ranking in queries]
+    for query, (results, total) in zip(queries, advisor.search_many(queries)):
+        expected = as_dicts(advisor.search_diseases(*query))
+        assert as_dicts(results) == expected
+        assert total == len(expected)
+
+
+def test_text_index_matches_substring_scan(catalog):
+    rng = random.Random(4)
+    for animal_type in sorted(catalog.species_names):
+        species = catalog.species(animal_type)
+        documents = [
+            (disease, (disease.name.lower(), disease.description.lower()) + disease.symptoms)
+            for disease in species.diseases
+        ]
+        index = TextIndex(documents)
+        for _ in range(QUERIES // len(catalog.species_names)):
+            query = random_text(rng, species)
+            expected = {disease for disease, texts in documents if any(query in text for text in texts)}
+            assert index.search(query) == expected
+
+
+def test_screen_herd_matches_search_diseases(catalog):
+    pytest.importorskip('numpy')
+    advisor = LivestockHealthAdvisor(catalog)
+    rng = random.Random(5)
+    for animal_type in sorted(catalog.species_names):
+        species = catalog.species(animal_type)
+        herd = [random_symptoms(rng, species) for _ in range(200)]
+        screening = advisor.screen_herd(animal_type, herd)
+        for animal, selected in enumerate(herd):
+            assert as_dicts(screening.results(animal)) == as_dicts(advisor.search_diseases(animal_type, selected, ''))
+
+
+def test_diagnose_record_matches_full_search(catalog):
+    advisor = LivestockHealthAdvisor(catalog)
+    rng = random.Random(6)
+    for animal_type in sorted(catalog.species_names):
+        species = catalog.species(animal_type)
+        for line_number in range(100):
+            record = {'animal_id': line_number, 'animal_type': animal_type, 'symptoms': random_symptoms(rng, species)}
+            limit = rng.randint(1, 5)
+            results = advisor.search_diseases(animal_type, record['symptoms'], '')
+            answer = advisor.diagnose_record(line_number, record, None, limit)
+            assert answer['urgent'] == any(result.urgent for result in results)
+            assert answer['results'] == as_dicts(results[:limit])
+
+
+def test_treatment_search_matches_substring_scan(catalog):
+    rng = random.Random(7)
+    for animal_type in sorted(catalog.species_names):
+        species = catalog.species(animal_type)
+        for _ in range(QUERIES // len(catalog.species_names)):
+            disease = rng.choice(species.diseases)
+            details = rng.choice(disease.treatments).details.lower()
+            start = rng.randrange(len(details))
+            query = details[start:start + rng.randint(1, 8)]
+            expected = {
+                disease for disease in species.diseases
+                if any(query in text for text in (disease.search_name, disease.search_description) + disease.symptoms)
+                or any(query in treatment.details.lower() for treatment in disease.treatments)
+            }
+            assert species.search_text(query, include_treatments=True) == expected
+
+
+# Misspelt search text still finds the disease it names, and only falls back to fuzzy matching
+@pytest.mark.parametrize('engine', ('fused', 'chain'))
+def test_fuzzy_search_finds_misspellings(engine):
+    advisor = LivestockHealthAdvisor(engine=engine, cache_size=0)
+    assert [result.name for result in advisor.search_diseases('cattle', [], 'mastitus')] == ['Mastitis']
+    diarrhea = [result.name for result in advisor.search_diseases('goat', [], 'diarrhea')]
+    assert diarrhea == ['Enterotoxemia (Overeating Disease)', 'Coccidiosis']
+    assert [result.name for result in advisor.search_diseases('goat', [], 'diarhea')] == diarrhea
+    exact = LivestockHealthAdvisor(engine=engine, fuzzy=False, cache_size=0)
+    assert exact.search_diseases('goat', [], 'diarhea') == []
+
+
+def test_diagnose_records_matches_diagnose_record(catalog):
+    pytest.importorskip('numpy')
+    advisor = LivestockHealthAdvisor(catalog)
+    rng = random.Random(8)
+    animal_types = sorted(catalog.species_names)
+    entries = []
+    for line_number in range(1, 501):
+        animal_type = rng.choice(animal_types + ['unicorn'])
+        species = catalog.species(rng.choice(animal_types))
+        record = {'animal_id': line_number, 'animal_type': animal_type, 'symptoms': random_symptoms(rng, species)}
+        if rng.random() < 0.05:
+            entries.append((line_number, None, 'invalid JSON'))
+        else:
+            entries.append((line_number, record, None))
+    for limit in (1, 3, 1000):
+        expected = [advisor.diagnose_record(line_number, record, error, limit) for line_number, record, error in entries]
+        assert advisor.diagnose_records(entries, limit) == expected
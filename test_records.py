@@ -0,0 +1,48 @@
+# Lines longer than MAX_LINE_BYTES are reported as errors on their own line
+# numbers, not split into further records.
+#
+# Run with: python -m pytest test_records.py
+
+import io
+
+from records import MAX_LINE_BYTES, decode_lines, read_records
+
+LONG_SYMPTOMS = ';'.join(['fever'] * MAX_LINE_BYTES)
+
+
+def read(text, record_format):
+    return list(read_records(decode_lines(io.BytesIO(text.encode('utf-8'))), record_format))
+
+
+def test_long_csv_line_is_one_error():
+    text = f'animal_id,animal_type,symptoms\nA1,goat,{LONG_SYMPTOMS}\nA2,goat,diarrhea;fever\n'
+    assert read(text, 'csv') == [
+        (2, None, 'line too long'),
+        (3, {'animal_id': 'A2', 'animal_type': 'goat', 'symptoms': ['diarrhea', 'fever']}, None)
+    ]
+
+
+def test_long_ndjson_line_keeps_line_numbers():
+    text = (
+        '{"animal_id": "A1", "symptoms": ["%s"]}\n' % ('é' * MAX_LINE_BYTES)
+        + '{"animal_id": "A2", "animal_type": "goat", "symptoms": ["fever"]}\n'
+        + '{"animal_id": "A3", "animal_type": "goat", "symptoms": ["cough"]}'
+    )
+    assert read(text, 'ndjson') == [
+        (1, None, 'line too long'),
+        (2, {'animal_id': 'A2', 'animal_type': 'goat', 'symptoms': ['fever']}, None),
+        (3, {'animal_id': 'A3', 'animal_type': 'goat', 'symptoms': ['cough']}, None)
+    ]
+
+
+def test_line_at_the_limit_is_read_whole():
+    symptom = 'x' * (MAX_LINE_BYTES - len('A1,goat,\n'))
+    text = f'animal_id,animal_type,symptoms\nA1,goat,{symptom}\n'
+    assert read(text, 'csv') == [(2, {'animal_id': 'A1', 'animal_type': 'goat', 'symptoms': [symptom]}, None)]
+    # The same line without its newline, ending the input
+    assert read(text[:-1] + 'y', 'csv') == [(2, {'animal_id': 'A1', 'animal_type': 'goat', 'symptoms': [symptom + 'y']}, None)]
+
+
+def test_long_csv_header_is_an_error():
+    text = f'animal_id,animal_type,{LONG_SYMPTOMS}\nA1,goat,fever\n'
+    assert read(text, 'csv') == [(1, None, 'line too long')]
@@ -0,0 +1,131 @@
+# Write-behind queue for rows that need not be stored on the request path.
+#
+# Requests put rows on an in-memory queue and carry on; a writer thread takes
+# them off in batches and hands each batch to `write`, which stores it in one
+# transaction. A batch is written once it holds batch_size rows or its first row
+# has waited `interval` seconds. The queue is bounded: when the writer falls that
+# far behind, new rows are dropped and counted rather than holding up requests.
+# close() writes everything still queued, and is meant to run at shutdown.
+#
+# A process forked after start() (gunicorn --preload) inherits the queue but not
+# the writer thread, so the child starts over with an empty queue and a writer of
+# its own; rows queued before the fork are the parent's to write.
+
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Put on the queue by close(); the writer stops when it reaches it
+STOP = object()
+
+
+class WriteBehindQueue:
+    # write: callable storing a list of rows in one transaction
+    def __init__(self, write, batch_size=100, interval=0.5, max_size=10000, name='write-behind'):
+        self.write = write
+        self.batch_size = batch_size
+        self.interval = interval
+        self.name = name
+        self.queue = queue.Queue(max_size)
+        self.closed = False
+        self.thread = None
+        # Rows taken off the queue for the batch being collected
+        self.batch = []
+        # Highest queue depth seen by put(), a cheap high-water mark
+        self.max_depth = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_error = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.after_fork)
+
+    # Queue a row without blocking; False when it was dropped
+    def put(self, row):
+        if self.closed:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def write_batch(self, batch):
+        try:
+            self.write(batch)
+        except Exception as error:
+            self.failed += len(batch)
+            self.last_error = f'{type(error).__name__}: {error}'
+            logger.exception('%s: lost a batch of %d rows', self.name, len(batch))
+        else:
+            self.written += len(batch)
+            self.batches += 1
+        self.batch = []
+
+    def run(self):
+        while True:
+            row = self.queue.get()
+            if row is STOP:
+                return
+            batch = self.batch = [row]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if row is STOP:
+                    self.write_batch(batch)
+                    return
+                batch.append(row)
+            self.write_batch(batch)
+
+    # Start the writer thread (a daemon: close() is what guarantees the final flush)
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+        return self
+
+    def after_fork(self):
+        started = self.thread is not None
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.thread = None
+        self.batch = []
+        self.max_depth = self.written = self.batches = self.dropped = self.failed = 0
+        self.last_error = None
+        if started and not self.closed:
+            self.start()
+
+    # Stop taking rows, write the queued ones and wait up to timeout seconds for the writer
+    def close(self, timeout=10.0):
+        if self.closed:
+            return
+        self.closed = True
+        self.start()
+        self.queue.put(STOP)
+        self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            'depth': self.queue.qsize(),
+            'pending': len(self.batch),
+            'max_depth': self.max_depth,
+            'max_size': self.queue.maxsize,
+            'batch_size': self.batch_size,
+            'interval': self.interval,
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'last_error': self.last_error,
+            'running': self.thread is not None and self.thread.is_alive()
+        }